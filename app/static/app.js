@@ -40,15 +40,57 @@ async function init(){
   })
 }
 
+async function askStream(q, onToken){
+  // Reads the SSE stream from /chat/stream; resolves with the final "done" payload
+  const res = await fetch(`${API_BASE}/chat/stream`, {method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({mode:'ask', question:q})})
+  if(!res.ok || !res.body) throw new Error('stream unavailable: ' + res.status)
+  const reader = res.body.getReader()
+  const decoder = new TextDecoder()
+  let buf = ''
+  let done = null
+  while(true){
+    const {value, done: finished} = await reader.read()
+    if(finished) break
+    buf += decoder.decode(value, {stream:true})
+    let sep
+    while((sep = buf.indexOf('\n\n')) >= 0){
+      const raw = buf.slice(0, sep)
+      buf = buf.slice(sep + 2)
+      let name = 'message', data = ''
+      raw.split('\n').forEach(line=>{
+        if(line.startsWith('event:')) name = line.slice(6).trim()
+        else if(line.startsWith('data:')) data += line.slice(5).trim()
+      })
+      if(!data) continue
+      const payload = JSON.parse(data)
+      if(name === 'token') onToken(payload.text)
+      else if(name === 'done') done = payload
+    }
+  }
+  return done
+}
+
 el('#ask').onclick = async () =>{
   const q = el('#question').value
   if(!q) return
   addMessage(q, 'user')
   setLoading(true)
-  const res = await fetch(`${API_BASE}/chat`, {method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({mode:'ask', question:q})})
-  const j = await res.json()
-  if(j && j.answer) addMessage(j.answer + `\n(confidence: ${j.confidence})`, 'bot')
-  else addMessage('No answer received.', 'bot')
+  const m = document.createElement('div')
+  m.className = 'msg bot'
+  el('#messages').appendChild(m)
+  try{
+    const j = await askStream(q, text=>{
+      setLoading(false)
+      m.textContent += text
+    })
+    if(j && j.incomplete) m.textContent = (j.answer || m.textContent) + '\n(The answer was cut off; please try again.)'
+    else if(j && j.answer) m.textContent = j.answer + `\n(confidence: ${j.confidence})`
+    else if(!m.textContent) m.textContent = 'No answer received.'
+  }catch(e){
+    const res = await fetch(`${API_BASE}/chat`, {method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({mode:'ask', question:q})})
+    const j = await res.json()
+    m.textContent = (j && j.answer) ? j.answer + `\n(confidence: ${j.confidence})` : 'No answer received.'
+  }
   setLoading(false)
 }
 
@@ -0,0 +1,112 @@
+"""Micro-benchmark for HTML text extraction on a corpus of saved pages.
+
+    python bench_html_extract.py --corpus saved_pages/ --repeat 3
+    python bench_html_extract.py --pages 200   # synthetic university-style pages
+
+Save a corpus with e.g. ``wget -r -l2 -A html -P saved_pages https://library.example.edu/``.
+"""
+import argparse
+import glob
+import importlib.util
+import os
+import random
+import tempfile
+import time
+import warnings
+
+from bs4 import BeautifulSoup
+
+from rag.html_extract import HTML_PARSERS, extract_sections, remove_site_chrome, sections_to_text
+
+
+def legacy_extract(html):
+    """The previous scraper path: full html.parser tree, decompose, get_text."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        soup = BeautifulSoup(html, 'html.parser')
+    links = [a['href'] for a in soup.find_all('a', href=True)]
+    for tag in soup(['script', 'style', 'nav', 'footer']):
+        tag.decompose()
+    text = soup.get_text(separator='\n', strip=True)
+    return '\n'.join(line.strip() for line in text.split('\n') if line.strip()), links
+
+
+def build_corpus(path, n_pages, seed=0):
+    rng = random.Random(seed)
+    words = "library catalogue journal borrowing renewal thesis archive reading room hours membership".split()
+    menu = "".join(f'<li><a href="/section{i}/page{j}">Section {i} item {j}</a></li>'
+                   for i in range(12) for j in range(8))
+    sidebar = '<div class="widget"><h3>Quick links</h3><p>Ask a librarian: library@example.edu</p></div>'
+    for n in range(n_pages):
+        paras = "".join(
+            f"<p>{' '.join(rng.choice(words) for _ in range(rng.randint(20, 80)))}</p>"
+            for _ in range(rng.randint(10, 40))
+        )
+        table = "<table>" + "".join(
+            f"<tr><td>Row {r}</td><td>{rng.choice(words)}</td><td>{r * 7}</td></tr>" for r in range(20)
+        ) + "</table>"
+        html = (
+            "<!doctype html><html><head><title>Page</title>"
+            + "<script>" + "var x = 1;" * 500 + "</script><style>" + "p{margin:0}" * 300 + "</style></head>"
+            + f'<body><div class="cookie-banner">We use cookies.</div><nav><ul>{menu}</ul></nav>'
+            + f"<main><h1>Page {n}</h1><h2>Overview</h2>{paras}<h2>Opening times</h2>{table}</main>"
+            + f'{sidebar}<footer><p>Copyright</p><ul>{menu}</ul></footer></body></html>'
+        )
+        with open(os.path.join(path, f"page{n}.html"), "w", encoding="utf-8") as f:
+            f.write(html)
+
+
+def best_of(fn, pages, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for html in pages:
+            fn(html)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def run(corpus_dir, repeat):
+    pages = []
+    for name in sorted(glob.glob(os.path.join(corpus_dir, "**", "*.htm*"), recursive=True)):
+        with open(name, "rb") as f:
+            pages.append(f.read())
+    if not pages:
+        raise SystemExit(f"no .html files under {corpus_dir}")
+    size_mb = sum(len(p) for p in pages) / 1e6
+    print(f"{len(pages)} pages, {size_mb:.1f} MB")
+
+    baseline = best_of(legacy_extract, pages, repeat)
+    print(f"  legacy bs4 get_text: best {baseline:.3f}s ({baseline / len(pages) * 1000:.2f} ms/page)")
+    for parser in HTML_PARSERS[1:]:
+        if importlib.util.find_spec(parser) is None:
+            print(f"  {parser}: not installed")
+            continue
+        seconds = best_of(lambda html: extract_sections(html, "http://localhost/", parser), pages, repeat)
+        print(f"  {parser} sections: best {seconds:.3f}s ({seconds / len(pages) * 1000:.2f} ms/page, "
+              f"{baseline / seconds:.1f}x)")
+
+    texts = [sections_to_text(extract_sections(html, "http://localhost/")[0]) for html in pages]
+    legacy_chars = sum(len(legacy_extract(html)[0]) for html in pages)
+    cleaned, dropped = remove_site_chrome(texts)
+    print(f"  text kept: legacy {legacy_chars} chars, sections {sum(map(len, texts))} chars, "
+          f"after site-chrome removal {sum(map(len, cleaned))} chars ({dropped} repeated blocks)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", help="directory of saved .html pages")
+    parser.add_argument("--pages", type=int, default=200, help="synthetic pages when --corpus is not given")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.corpus:
+        run(args.corpus, args.repeat)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        build_corpus(tmp, args.pages)
+        run(tmp, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
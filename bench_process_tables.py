@@ -0,0 +1,155 @@
+"""Micro-benchmark for utils/process_tables on a DOCX with many tables.
+
+    python bench_process_tables.py --tables 400 --rows 12 --marker-every 4
+"""
+import argparse
+import os
+import re
+import tempfile
+import time
+
+import mammoth
+from bs4 import BeautifulSoup
+from docx import Document
+
+from utils.process_tables import extract_and_replace_docx_tables, extract_html_tables, get_html_table_chunks, wrap_signal
+
+CHUNK_MARKER = "[CHUNK]"
+
+
+def build_docx(path, n_tables, n_rows, marker_every):
+    document = Document()
+    for t in range(n_tables):
+        document.add_paragraph(f"Table {t}")
+        table = document.add_table(rows=n_rows, cols=4)
+        for r, row in enumerate(table.rows):
+            for c, cell in enumerate(row.cells):
+                cell.text = "Header" if r == 0 else f"t{t} r{r} c{c}"
+            if r and marker_every and r % marker_every == 0 and r < n_rows - 1:
+                # the authoring convention: a bold marker in the row to split after
+                row.cells[-1].paragraphs[0].add_run(CHUNK_MARKER).bold = True
+    document.save(path)
+
+
+def legacy_extract_html_tables(html):
+    """The previous table extraction: a full html.parser tree, every <table>."""
+    return BeautifulSoup(html, 'html.parser').find_all('table')
+
+
+def legacy_get_html_table_chunks(tables, chunk_marker, scratch):
+    """The previous line-based split, round-tripping each table through a temp file."""
+    html_chunk_marker = '<strong>' + chunk_marker + '</strong>'
+    html_table_chunks = []
+    for table_soup in tables:
+        html_table_string = str(table_soup)
+        html_table_string = html_table_string.replace('<table>', '<table>\n')
+        html_table_string = html_table_string.replace('<tr>', '\n<tr>\n')
+        html_table_string = html_table_string.replace('</tr>', '\n</tr>')
+        html_table_string = html_table_string.replace('</thead>', '\n</thead>\n')
+        html_table_string = html_table_string.replace('</tbody>', '\n</tbody>\n')
+        with open(scratch, mode='w', encoding='utf8') as f:
+            f.write(html_table_string)
+        with open(scratch, mode='r', encoding='utf8') as f:
+            lines = f.readlines()
+
+        start_table = lines[0].strip()
+        end_table = lines[-1].strip()
+        start_tbody = '<tbody>' if '<tbody>' in html_table_string else ''
+        end_tbody = '</tbody>' if '</tbody>' in html_table_string else ''
+        headers = str(table_soup.find('thead')) if 'thead' in html_table_string else ''
+        headers = re.sub(r'>\n\s*<', '><', headers)
+
+        processed_lines = []
+        for line in lines:
+            if chunk_marker in line:
+                start_index = line.find(html_chunk_marker)
+                chunk_html = line[start_index - len('<p>'):start_index + len(html_chunk_marker) + len('</p>')]
+                if chunk_html.startswith('<p>') & chunk_html.endswith('</p>'):
+                    line = line.replace('<p>', '').replace('</p>', '')
+                line = line.replace(html_chunk_marker, '')
+                line = line.replace(' </td>', '</td>').strip()
+                line += chunk_marker
+            processed_lines.append(line.strip())
+        html_chunks = ''.join(processed_lines).split(chunk_marker)
+
+        pieces = []
+        for index, chunk in enumerate(html_chunks):
+            if index == 0:
+                chunk += (end_tbody + end_table)
+                first_chunk = chunk.replace(end_table, '')
+                headers = first_chunk[first_chunk.find('<tr>'):first_chunk.find('</tr>') + len('</tr>')]
+            elif chunk == html_chunks[-1]:
+                chunk = start_table + headers + start_tbody + chunk
+            else:
+                chunk = start_table + headers + start_tbody + chunk + end_tbody + end_table
+            pieces.append(chunk)
+
+        chunks_to_html = ''
+        for html_chunk in pieces:
+            chunks_to_html += wrap_signal(html_chunk, signal_type='html')
+            if html_chunk != pieces[-1]:
+                chunks_to_html += f'\n\n{chunk_marker}\n\n'
+        html_table_chunks.append(chunks_to_html)
+    return html_table_chunks
+
+
+def legacy_extract_and_replace(path, chunk_marker, scratch):
+    """The previous end-to-end path: a Document per table, then the ``while document.tables`` replace loop."""
+    document = Document(path)
+    with open(path, "rb") as f:
+        html = mammoth.convert_to_html(f).value
+    chunks = legacy_get_html_table_chunks(legacy_extract_html_tables(html), chunk_marker, scratch)
+    html_tables = [Document().add_paragraph(chunk)._element for chunk in chunks]
+    while len(document.tables) > 0 and html_tables:
+        html_table = html_tables[0]
+        document.element.body.replace(document.tables[0]._element, html_table)
+        html_tables.remove(html_table)
+    return document, chunks
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tables", type=int, default=400)
+    parser.add_argument("--rows", type=int, default=12)
+    parser.add_argument("--marker-every", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tables.docx")
+        scratch = os.path.join(tmp, "table_html.txt")
+        build_docx(path, args.tables, args.rows, args.marker_every)
+        document, chunks = extract_and_replace_docx_tables(path, CHUNK_MARKER)
+        pieces = sum(c.count("```html") for c in chunks)
+        print(f"{args.tables} tables x {args.rows} rows -> {pieces} table chunks, "
+              f"{len(document.tables)} tables left in the document")
+
+        baseline = best_of(lambda: legacy_extract_and_replace(path, CHUNK_MARKER, scratch), args.repeat)
+        seconds = best_of(lambda: extract_and_replace_docx_tables(path, CHUNK_MARKER), args.repeat)
+        print(f"extract_and_replace_docx_tables: legacy best {baseline:.3f}s, "
+              f"now best {seconds:.3f}s ({seconds / args.tables * 1000:.2f} ms/table, "
+              f"{baseline / seconds:.1f}x) over {args.repeat} runs")
+
+        # the same work split into phases; mammoth runs once per file
+        with open(path, "rb") as f:
+            started = time.perf_counter()
+            html = mammoth.convert_to_html(f).value
+            mammoth_s = time.perf_counter() - started
+        print(f"  mammoth conversion: {mammoth_s:.3f}s")
+        baseline = best_of(
+            lambda: legacy_get_html_table_chunks(legacy_extract_html_tables(html), CHUNK_MARKER, scratch), args.repeat)
+        seconds = best_of(lambda: get_html_table_chunks(extract_html_tables(html), CHUNK_MARKER), args.repeat)
+        print(f"  table extraction + chunking: legacy best {baseline:.3f}s, now best {seconds:.3f}s "
+              f"({seconds / args.tables * 1000:.3f} ms/table, {baseline / seconds:.1f}x)")
+
+if __name__ == "__main__":
+    main()
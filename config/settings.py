@@ -31,6 +31,61 @@ if BaseSettings is None:
         CHUNK_OVERLAP_TOKENS: int = int(os.getenv('CHUNK_OVERLAP_TOKENS', '300'))
         SIMILARITY_THRESHOLD: float = float(os.getenv('SIMILARITY_THRESHOLD', '0.35'))
         TOP_K: int = int(os.getenv('TOP_K', '8'))
+        INDEX_SNAPSHOT_DIR: str = os.getenv('INDEX_SNAPSHOT_DIR', 'index_snapshot')
+        INDEX_SNAPSHOT_MMAP: bool = os.getenv('INDEX_SNAPSHOT_MMAP', 'true').lower() in ('1', 'true', 'yes')
+        EMBED_BATCH_SIZE: int = int(os.getenv('EMBED_BATCH_SIZE', '64'))
+        LLM_MAX_CONNECTIONS: int = int(os.getenv('LLM_MAX_CONNECTIONS', '20'))
+        LLM_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', '10'))
+        LLM_KEEPALIVE_EXPIRY: float = float(os.getenv('LLM_KEEPALIVE_EXPIRY', '60'))
+        LLM_TIMEOUT_SECONDS: float = float(os.getenv('LLM_TIMEOUT_SECONDS', '30'))
+        LLM_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv('LLM_CONNECT_TIMEOUT_SECONDS', '5'))
+        LLM_MAX_RETRIES: int = int(os.getenv('LLM_MAX_RETRIES', '2'))
+        ANSWER_CACHE_ENABLED: bool = os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+        ANSWER_CACHE_SIZE: int = int(os.getenv('ANSWER_CACHE_SIZE', '1000'))
+        ANSWER_CACHE_TTL_SECONDS: float = float(os.getenv('ANSWER_CACHE_TTL_SECONDS', '86400'))
+        ANSWER_CACHE_THRESHOLD: float = float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95'))
+        QUERY_EMBED_CACHE_SIZE: int = int(os.getenv('QUERY_EMBED_CACHE_SIZE', '4096'))
+        QUERY_EMBED_CACHE_PATH: str = os.getenv('QUERY_EMBED_CACHE_PATH', '')
+        QUERY_BATCH_MAX_SIZE: int = int(os.getenv('QUERY_BATCH_MAX_SIZE', '32'))
+        QUERY_BATCH_MAX_WAIT_MS: float = float(os.getenv('QUERY_BATCH_MAX_WAIT_MS', '5'))
+        INDEX_TYPE: str = os.getenv('INDEX_TYPE', 'flat')
+        HNSW_M: int = int(os.getenv('HNSW_M', '32'))
+        HNSW_EF_CONSTRUCTION: int = int(os.getenv('HNSW_EF_CONSTRUCTION', '200'))
+        HNSW_EF_SEARCH: int = int(os.getenv('HNSW_EF_SEARCH', '64'))
+        IVF_NLIST: int = int(os.getenv('IVF_NLIST', '0'))
+        IVF_NPROBE: int = int(os.getenv('IVF_NPROBE', '8'))
+        PQ_M: int = int(os.getenv('PQ_M', '16'))
+        PQ_NBITS: int = int(os.getenv('PQ_NBITS', '8'))
+        INDEX_RECALL_SAMPLE: int = int(os.getenv('INDEX_RECALL_SAMPLE', '200'))
+        FALLBACK_MATRIX_DTYPE: str = os.getenv('FALLBACK_MATRIX_DTYPE', 'float32')
+        FALLBACK_BLOCK_ROWS: int = int(os.getenv('FALLBACK_BLOCK_ROWS', '65536'))
+        LEXICAL_ENABLED: bool = os.getenv('LEXICAL_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+        LEXICAL_WEIGHT: float = float(os.getenv('LEXICAL_WEIGHT', '0.5'))
+        HYBRID_FUSION: str = os.getenv('HYBRID_FUSION', 'rrf')
+        HYBRID_RRF_K: int = int(os.getenv('HYBRID_RRF_K', '60'))
+        HYBRID_CANDIDATES: int = int(os.getenv('HYBRID_CANDIDATES', '32'))
+        BM25_K1: float = float(os.getenv('BM25_K1', '1.2'))
+        BM25_B: float = float(os.getenv('BM25_B', '0.75'))
+        RERANK_ENABLED: bool = os.getenv('RERANK_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+        RERANK_MODEL: str = os.getenv('RERANK_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+        RERANK_CANDIDATES: int = int(os.getenv('RERANK_CANDIDATES', '24'))
+        RERANK_TOP_N: int = int(os.getenv('RERANK_TOP_N', '4'))
+        RERANK_BUDGET_MS: float = float(os.getenv('RERANK_BUDGET_MS', '150'))
+        LLM_MODEL: str = os.getenv('LLM_MODEL', 'gpt-4o-mini')
+        PROMPT_CONTEXT_TOKENS: int = int(os.getenv('PROMPT_CONTEXT_TOKENS', '3000'))
+        CONTEXT_DEDUP_THRESHOLD: float = float(os.getenv('CONTEXT_DEDUP_THRESHOLD', '0.8'))
+        MERGE_ADJACENT_CHUNKS: bool = os.getenv('MERGE_ADJACENT_CHUNKS', 'true').lower() in ('1', 'true', 'yes')
+        MERGE_MAX_GAP_CHARS: int = int(os.getenv('MERGE_MAX_GAP_CHARS', '8'))
+        CHUNKER: str = os.getenv('CHUNKER', 'structure')
+        CHUNK_MARKER: str = os.getenv('CHUNK_MARKER', '')
+        INGEST_WORKERS: int = int(os.getenv('INGEST_WORKERS', '4'))
+        PDF_BACKEND: str = os.getenv('PDF_BACKEND', 'auto')
+        CRAWL_CONCURRENCY: int = int(os.getenv('CRAWL_CONCURRENCY', '4'))
+        CRAWL_DELAY_SECONDS: float = float(os.getenv('CRAWL_DELAY_SECONDS', '0.25'))
+        CRAWL_CACHE_PATH: str = os.getenv('CRAWL_CACHE_PATH', 'crawl_cache.sqlite3')
+        CRAWL_MODE: str = os.getenv('CRAWL_MODE', 'links')
+        HTML_PARSER: str = os.getenv('HTML_PARSER', 'auto')
+        WEB_DEDUP_THRESHOLD: float = float(os.getenv('WEB_DEDUP_THRESHOLD', '0.8'))
 
     settings = Settings()
 else:
@@ -41,6 +96,61 @@ else:
         CHUNK_OVERLAP_TOKENS: int = 300
         SIMILARITY_THRESHOLD: float = 0.35
         TOP_K: int = 8
+        INDEX_SNAPSHOT_DIR: str = "index_snapshot"
+        INDEX_SNAPSHOT_MMAP: bool = True
+        EMBED_BATCH_SIZE: int = 64
+        LLM_MAX_CONNECTIONS: int = 20
+        LLM_MAX_KEEPALIVE_CONNECTIONS: int = 10
+        LLM_KEEPALIVE_EXPIRY: float = 60.0
+        LLM_TIMEOUT_SECONDS: float = 30.0
+        LLM_CONNECT_TIMEOUT_SECONDS: float = 5.0
+        LLM_MAX_RETRIES: int = 2
+        ANSWER_CACHE_ENABLED: bool = True
+        ANSWER_CACHE_SIZE: int = 1000
+        ANSWER_CACHE_TTL_SECONDS: float = 86400.0
+        ANSWER_CACHE_THRESHOLD: float = 0.95
+        QUERY_EMBED_CACHE_SIZE: int = 4096
+        QUERY_EMBED_CACHE_PATH: str = ""
+        QUERY_BATCH_MAX_SIZE: int = 32
+        QUERY_BATCH_MAX_WAIT_MS: float = 5.0
+        INDEX_TYPE: str = "flat"
+        HNSW_M: int = 32
+        HNSW_EF_CONSTRUCTION: int = 200
+        HNSW_EF_SEARCH: int = 64
+        IVF_NLIST: int = 0
+        IVF_NPROBE: int = 8
+        PQ_M: int = 16
+        PQ_NBITS: int = 8
+        INDEX_RECALL_SAMPLE: int = 200
+        FALLBACK_MATRIX_DTYPE: str = "float32"
+        FALLBACK_BLOCK_ROWS: int = 65536
+        LEXICAL_ENABLED: bool = True
+        LEXICAL_WEIGHT: float = 0.5
+        HYBRID_FUSION: str = "rrf"
+        HYBRID_RRF_K: int = 60
+        HYBRID_CANDIDATES: int = 32
+        BM25_K1: float = 1.2
+        BM25_B: float = 0.75
+        RERANK_ENABLED: bool = False
+        RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+        RERANK_CANDIDATES: int = 24
+        RERANK_TOP_N: int = 4
+        RERANK_BUDGET_MS: float = 150.0
+        LLM_MODEL: str = "gpt-4o-mini"
+        PROMPT_CONTEXT_TOKENS: int = 3000
+        CONTEXT_DEDUP_THRESHOLD: float = 0.8
+        MERGE_ADJACENT_CHUNKS: bool = True
+        MERGE_MAX_GAP_CHARS: int = 8
+        CHUNKER: str = 'structure'
+        CHUNK_MARKER: str = ''
+        INGEST_WORKERS: int = 4
+        PDF_BACKEND: str = 'auto'
+        CRAWL_CONCURRENCY: int = 4
+        CRAWL_DELAY_SECONDS: float = 0.25
+        CRAWL_CACHE_PATH: str = 'crawl_cache.sqlite3'
+        CRAWL_MODE: str = 'links'
+        HTML_PARSER: str = 'auto'
+        WEB_DEDUP_THRESHOLD: float = 0.8
 
         # support env_file for both pydantic v1 and v2
         if getattr(pydantic, '__version__', '').startswith('2'):
@@ -0,0 +1,132 @@
+import logging
+import math
+import time
+from typing import Any, Dict
+
+import numpy as np
+
+from config.settings import settings
+from rag import linear_search
+
+try:
+    import faiss
+except Exception:
+    faiss = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+
+def index_params_from_settings() -> Dict[str, Any]:
+    index_type = settings.INDEX_TYPE.lower()
+    if index_type not in INDEX_TYPES:
+        logger.warning(f"Unknown INDEX_TYPE {settings.INDEX_TYPE!r}; using flat")
+        index_type = "flat"
+    return {
+        "type": index_type,
+        "hnsw_m": settings.HNSW_M,
+        "hnsw_ef_construction": settings.HNSW_EF_CONSTRUCTION,
+        "hnsw_ef_search": settings.HNSW_EF_SEARCH,
+        "ivf_nlist": settings.IVF_NLIST,
+        "ivf_nprobe": settings.IVF_NPROBE,
+        "pq_m": settings.PQ_M,
+        "pq_nbits": settings.PQ_NBITS,
+        "fallback_dtype": settings.FALLBACK_MATRIX_DTYPE.lower(),
+        "fallback_block_rows": settings.FALLBACK_BLOCK_ROWS,
+        "lexical_enabled": settings.LEXICAL_ENABLED,
+        "lexical_weight": settings.LEXICAL_WEIGHT,
+        "fusion": settings.HYBRID_FUSION.lower(),
+        "rrf_k": settings.HYBRID_RRF_K,
+        "hybrid_candidates": settings.HYBRID_CANDIDATES,
+        "bm25_k1": settings.BM25_K1,
+        "bm25_b": settings.BM25_B,
+    }
+
+
+def supports_remove(index) -> bool:
+    """HNSW graphs cannot drop vectors; everything else here can."""
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    return not isinstance(inner, faiss.IndexHNSW)
+
+
+def _auto_nlist(n: int) -> int:
+    # ~4*sqrt(N) lists, but keep >= 39 training points per centroid
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def _pq_m(d: int, requested: int) -> int:
+    # PQ needs d divisible by the number of sub-quantizers
+    m = max(1, min(requested, d))
+    while d % m:
+        m -= 1
+    return m
+
+
+def _effective_type(params: Dict[str, Any], n: int) -> str:
+    kind = params["type"]
+    if kind in ("ivf_flat", "ivf_pq") and n < 39:
+        logger.info(f"Only {n} vectors; too few to train {kind}, using flat")
+        return "flat"
+    if kind == "ivf_pq" and n < 2 ** params["pq_nbits"]:
+        logger.info(f"Only {n} vectors; too few to train PQ codebooks, using ivf_flat")
+        return "ivf_flat"
+    return kind
+
+
+def make_index(embs: np.ndarray, ids: np.ndarray, params: Dict[str, Any]):
+    """Build, train if needed, and fill an inner-product index with ids."""
+    embs = np.ascontiguousarray(embs, dtype="float32")
+    n, d = embs.shape
+    kind = _effective_type(params, n)
+    started = time.perf_counter()
+    if kind == "hnsw":
+        inner = faiss.IndexHNSWFlat(d, params["hnsw_m"], faiss.METRIC_INNER_PRODUCT)
+        inner.hnsw.efConstruction = params["hnsw_ef_construction"]
+        index = faiss.IndexIDMap2(inner)
+    elif kind in ("ivf_flat", "ivf_pq"):
+        nlist = params["ivf_nlist"] or _auto_nlist(n)
+        nlist = max(1, min(nlist, n))
+        quantizer = faiss.IndexFlatIP(d)
+        if kind == "ivf_pq":
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, _pq_m(d, params["pq_m"]),
+                                     params["pq_nbits"], faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(embs)
+        # IVF indexes store ids themselves, so no IDMap wrapper is needed
+        logger.info(f"Trained {kind} index: nlist={nlist}, {n} training vectors")
+    else:
+        index = faiss.IndexIDMap2(faiss.IndexFlatIP(d))
+    index.add_with_ids(embs, np.asarray(ids, dtype="int64"))
+    set_search_params(index, params)
+    logger.info(f"Built {kind} index over {n} vectors in {time.perf_counter() - started:.2f}s")
+    return index
+
+
+def set_search_params(index, params: Dict[str, Any]):
+    """Apply nprobe / efSearch to an index (or the index inside an IDMap)."""
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else faiss.downcast_index(index)
+    if isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = min(params["ivf_nprobe"], inner.nlist)
+    elif isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = params["hnsw_ef_search"]
+
+
+def recall_vs_flat(index, embs: np.ndarray, ids: np.ndarray, k: int, sample: int) -> float:
+    """Mean recall@k of index against exact search, using sampled corpus vectors as queries."""
+    n = len(embs)
+    if n == 0 or sample <= 0:
+        return 1.0
+    k = min(k, n)
+    rng = np.random.default_rng(0)
+    rows = rng.choice(n, size=min(sample, n), replace=False)
+    Q = np.ascontiguousarray(embs[rows], dtype="float32")
+    # exact neighbours in row blocks: no sample x N score matrix or float32 copy of embs
+    _, exact = linear_search.topk_inner_product(embs, Q, k)
+    _, approx = index.search(Q, k)
+    ids = np.asarray(ids)
+    hit = 0
+    for truth_rows, got in zip(exact, approx):
+        hit += len(set(ids[truth_rows].tolist()) & set(got.tolist()))
+    return hit / (len(rows) * k)
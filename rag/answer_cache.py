@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticAnswerCache:
+    """LRU/TTL cache of answers keyed by query embedding similarity.
+
+    A lookup hits when a cached query from the same index generation has a
+    cosine similarity of at least ``threshold`` with the new query. Vectors
+    are expected to be L2-normalised, so cosine is a plain dot product over
+    a small (capacity x d) matrix.
+    """
+
+    def __init__(self, capacity: int = 1000, ttl_seconds: float = 86400.0, threshold: float = 0.95):
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_key = 0
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: list = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+        self.tokens_saved = 0
+
+    def _expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return self.ttl_seconds > 0 and now - entry["created"] > self.ttl_seconds
+
+    def _rebuild_matrix(self):
+        self._matrix_keys = list(self._entries.keys())
+        if self._matrix_keys:
+            self._matrix = np.vstack([self._entries[k]["vector"] for k in self._matrix_keys])
+        else:
+            self._matrix = None
+
+    def lookup(self, query_vector: np.ndarray, generation: int) -> Optional[Dict[str, Any]]:
+        """Return the cached payload for a similar query, or None."""
+        now = time.time()
+        with self._lock:
+            if self._matrix is None:
+                self._rebuild_matrix()
+            best_key, best_sim = None, self.threshold
+            if self._matrix is not None:
+                sims = self._matrix @ query_vector.reshape(-1)
+                for row in np.argsort(-sims):
+                    sim = float(sims[row])
+                    if sim < self.threshold:
+                        break
+                    key = self._matrix_keys[row]
+                    entry = self._entries.get(key)
+                    if entry is None or entry["generation"] != generation or self._expired(entry, now):
+                        continue
+                    best_key, best_sim = key, sim
+                    break
+            if best_key is None:
+                self.misses += 1
+                return None
+            entry = self._entries[best_key]
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            self.latency_saved += entry["latency"]
+            self.tokens_saved += entry["tokens"]
+        logger.info(f"Answer cache hit (similarity={best_sim:.3f}, generation={generation})")
+        return entry["payload"]
+
+    def store(self, query_vector: np.ndarray, generation: int, payload: Dict[str, Any],
+              latency: float = 0.0, tokens: int = 0):
+        now = time.time()
+        with self._lock:
+            # drop expired entries and entries from older generations first
+            for key in [k for k, e in self._entries.items() if self._expired(e, now) or e["generation"] < generation]:
+                del self._entries[key]
+            self._entries[self._next_key] = {
+                "vector": np.asarray(query_vector, dtype="float32").reshape(-1),
+                "generation": generation,
+                "payload": payload,
+                "created": now,
+                "latency": latency,
+                "tokens": tokens,
+            }
+            self._next_key += 1
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "latency_saved_seconds": round(self.latency_saved, 2),
+            "tokens_saved": self.tokens_saved,
+        }
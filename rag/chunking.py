@@ -0,0 +1,200 @@
+import logging
+import re
+from typing import List, Optional, Tuple
+
+from rag.context import count_tokens
+
+logger = logging.getLogger(__name__)
+
+CHUNKERS = ("fixed", "structure")
+
+Span = Tuple[int, int]
+
+_LINE_RE = re.compile(r"[^\n]*\n?")
+_HEADING_RE = re.compile(r"#{1,6}[ \t]+\S")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def _strip_span(text: str, start: int, end: int) -> Optional[Span]:
+    """Shrink [start, end) past surrounding whitespace; None if nothing is left."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return (start, end) if start < end else None
+
+
+class FixedChunker:
+    """Fixed windows of ``chunk_size`` tokens, approximated as 4 characters each."""
+
+    chars_per_token = 4
+    # windows run across form feeds, so a chunk may cover two PDF pages
+    respects_pages = False
+
+    def __init__(self, chunk_size: int, overlap: int):
+        self.chunk_chars = max(1, chunk_size * self.chars_per_token)
+        self.overlap_chars = min(int(overlap * self.chars_per_token), self.chunk_chars - 1)
+
+    def split(self, text: str, start: int = 0, end: Optional[int] = None) -> List[Span]:
+        """(start, end) offsets of each chunk; ``text[start:end]`` is exactly the chunk text."""
+        end = len(text) if end is None else end
+        spans = []
+        pos = start
+        while pos < end:
+            stop = min(pos + self.chunk_chars, end)
+            span = _strip_span(text, pos, stop)
+            if span:  # Only add non-empty chunks
+                spans.append(span)
+            if stop == end:
+                break
+            pos = stop - self.overlap_chars
+        return spans
+
+
+class StructureChunker:
+    """Packs whole structural blocks into chunks of at most ``chunk_size`` tokens.
+
+    One pass over the lines splits the text into blocks: blank lines end a
+    paragraph, Markdown headings start a new section, and form feeds (PDF
+    page breaks) and ``marker`` (the ``chunk_marker`` written by
+    utils/process_tables) are hard boundaries. Fenced blocks such as the
+    wrapped HTML tables are never split at blank lines. Blocks are then
+    packed greedily by real token count; a chunk never spans a section,
+    page or marker boundary, and trailing paragraphs of up to ``overlap``
+    tokens are repeated at the start of the next chunk. A block too large
+    for one chunk is split at sentence ends, then by fixed windows.
+    """
+
+    respects_pages = True
+
+    def __init__(self, chunk_size: int, overlap: int, model: str, marker: str = ""):
+        self.chunk_size = max(1, chunk_size)
+        self.overlap = max(0, min(overlap, chunk_size // 2))
+        self.model = model
+        self.marker = marker
+        self.fallback = FixedChunker(chunk_size, 0)
+        hard = [re.escape("\f")]
+        if marker:
+            hard.append(re.escape(marker))
+        self._hard_re = re.compile("|".join(hard))
+
+    def _tokens(self, text: str, start: int, end: int) -> int:
+        return count_tokens(text[start:end], self.model)
+
+    def _blocks(self, text: str) -> List[Tuple[int, int, bool]]:
+        """(start, end, starts_section) for every paragraph-level block."""
+        blocks = []
+        seg_start = 0
+        separators = [(m.start(), m.end()) for m in self._hard_re.finditer(text)]
+        separators.append((len(text), len(text)))
+        for sep_start, sep_end in separators:
+            new_section = True
+            block_start = None
+            in_fence = False
+            for m in _LINE_RE.finditer(text, seg_start, sep_start):
+                if m.start() == m.end():
+                    break
+                line = m.group().strip()
+                if line.startswith("```"):
+                    in_fence = not in_fence
+                if not in_fence and not line.startswith("```"):
+                    if not line or _HEADING_RE.match(line):
+                        if block_start is not None:
+                            span = _strip_span(text, block_start, m.start())
+                            if span:
+                                blocks.append((span[0], span[1], new_section))
+                                new_section = False
+                        block_start = None
+                        if line:
+                            new_section = True
+                            block_start = m.start()
+                        continue
+                if block_start is None:
+                    block_start = m.start()
+            if block_start is not None:
+                span = _strip_span(text, block_start, sep_start)
+                if span:
+                    blocks.append((span[0], span[1], new_section))
+            seg_start = sep_end
+        return blocks
+
+    def _split_long(self, text: str, start: int, end: int) -> List[Span]:
+        """Split one oversized block at sentence ends, falling back to fixed windows."""
+        spans = []
+        pieces = []
+        pos = start
+        for m in _SENTENCE_END_RE.finditer(text, start, end):
+            pieces.append((pos, m.start()))
+            pos = m.end()
+        pieces.append((pos, end))
+        cur_start = cur_end = None
+        cur_tokens = 0
+        for p_start, p_end in pieces:
+            tokens = self._tokens(text, p_start, p_end)
+            if tokens > self.chunk_size:
+                if cur_start is not None:
+                    spans.append((cur_start, cur_end))
+                    cur_start = None
+                spans.extend(self.fallback.split(text, p_start, p_end))
+                continue
+            if cur_start is not None and cur_tokens + tokens > self.chunk_size:
+                spans.append((cur_start, cur_end))
+                cur_start = None
+            if cur_start is None:
+                cur_start, cur_tokens = p_start, 0
+            cur_end = p_end
+            cur_tokens += tokens
+        if cur_start is not None:
+            spans.append((cur_start, cur_end))
+        return [s for s in (_strip_span(text, a, b) for a, b in spans) if s]
+
+    def split(self, text: str) -> List[Span]:
+        """(start, end) offsets of each chunk; ``text[start:end]`` is exactly the chunk text."""
+        if not text:
+            return []
+        spans: List[Span] = []
+        current: List[Tuple[int, int, int]] = []  # (start, end, tokens)
+        current_tokens = 0
+
+        def flush(carry: bool):
+            nonlocal current, current_tokens
+            if not current:
+                return
+            spans.append((current[0][0], current[-1][1]))
+            kept: List[Tuple[int, int, int]] = []
+            kept_tokens = 0
+            if carry and self.overlap:
+                for block in reversed(current[1:]):
+                    if kept_tokens + block[2] > self.overlap:
+                        break
+                    kept.insert(0, block)
+                    kept_tokens += block[2]
+            current, current_tokens = kept, kept_tokens
+
+        for start, end, starts_section in self._blocks(text):
+            if starts_section:
+                flush(carry=False)
+            tokens = self._tokens(text, start, end)
+            if tokens > self.chunk_size:
+                flush(carry=False)
+                spans.extend(self._split_long(text, start, end))
+                continue
+            if current and current_tokens + tokens > self.chunk_size:
+                flush(carry=True)
+                # carried overlap gives way to the new block rather than overfill the chunk
+                while current and current_tokens + tokens > self.chunk_size:
+                    current_tokens -= current.pop(0)[2]
+            current.append((start, end, tokens))
+            current_tokens += tokens
+        flush(carry=False)
+        return spans
+
+
+def make_chunker(name: str, chunk_size: int, overlap: int, model: str, marker: str = ""):
+    name = (name or "").lower()
+    if name not in CHUNKERS:
+        logger.warning(f"Unknown CHUNKER {name!r}; using structure")
+        name = "structure"
+    if name == "fixed":
+        return FixedChunker(chunk_size, overlap)
+    return StructureChunker(chunk_size, overlap, model, marker)
@@ -0,0 +1,91 @@
+import logging
+import re
+from functools import lru_cache
+from typing import List, Set, Tuple
+
+from utils.sanitizer import clean_retrieved_doc
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+SHINGLE_SIZE = 5
+# don't bother appending a truncated tail shorter than this
+MIN_PARTIAL_TOKENS = 48
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # the BPE file is downloaded on first use; offline hosts fall back
+        logger.warning("tiktoken encoding unavailable (%s); estimating tokens from characters", e)
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Real token count for model when tiktoken is installed, else ~4 chars/token."""
+    enc = _encoding(model)
+    if enc is None:
+        return (len(text) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str) -> str:
+    enc = _encoding(model)
+    if enc is None:
+        return text[: max_tokens * 4]
+    return enc.decode(enc.encode(text, disallowed_special=())[:max_tokens])
+
+
+def _shingles(text: str) -> Set[int]:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {hash(" ".join(words))} if words else set()
+    return {hash(" ".join(words[i:i + SHINGLE_SIZE])) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def build_context(retrieved: List[Tuple[str, float]], budget_tokens: int, model: str,
+                  dedup_threshold: float = 0.8) -> Tuple[str, int, int]:
+    """Assemble the prompt context from retrieved chunks within a token budget.
+
+    Chunks are taken in retrieval rank order (best first). A chunk whose
+    word 5-gram shingles are at least ``dedup_threshold`` contained in
+    chunks already selected is skipped as a near-duplicate. The last chunk that does not fit is
+    truncated to the remaining budget. Returns (context, chunks used, tokens).
+    """
+    header = "RETRIEVED LIBRARY INFORMATION:\n\n"
+    parts = [header]
+    used_tokens = count_tokens(header, model)
+    seen: Set[int] = set()
+    n_used = 0
+    for doc, _ in retrieved:
+        safe_doc = clean_retrieved_doc(doc)
+        if not safe_doc or not safe_doc.strip():
+            continue
+        shingles = _shingles(safe_doc)
+        if shingles and seen and len(shingles & seen) / len(shingles) >= dedup_threshold:
+            logger.debug("Skipping near-duplicate chunk")
+            continue
+        block = f"[Source {n_used + 1}]\n{safe_doc}\n\n"
+        block_tokens = count_tokens(block, model)
+        remaining = budget_tokens - used_tokens
+        if block_tokens > remaining:
+            if remaining < MIN_PARTIAL_TOKENS:
+                break
+            block = truncate_tokens(block, remaining, model)
+            block_tokens = count_tokens(block, model)
+        parts.append(block)
+        used_tokens += block_tokens
+        seen |= shingles
+        n_used += 1
+        if used_tokens >= budget_tokens:
+            break
+    return "".join(parts), n_used, used_tokens
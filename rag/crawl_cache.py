@@ -0,0 +1,76 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlCache:
+    """SQLite record of every crawled page: validators, text hash, text and links.
+
+    The scraper sends the stored ETag / Last-Modified back as
+    If-None-Match / If-Modified-Since; on 304 Not Modified the cached text
+    and links are used without downloading or parsing the page again. It is
+    also the crawler's visited set across runs: a sitemap ``<lastmod>`` no
+    later than ``fetched_at`` means the page is reused without a request.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, sha256 TEXT NOT NULL, "
+            "text TEXT NOT NULL, links TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, sha256, text, links, fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "sha256": row[2],
+                "text": row[3], "links": json.loads(row[4]), "fetched_at": row[5]}
+
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str], sha256: str,
+            text: str, links: List[str]):
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO pages (url, etag, last_modified, sha256, text, links, fetched_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (url, etag, last_modified, sha256, text, json.dumps(links), time.time()),
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.debug("failed to persist crawled page %s: %s", url, e)
+
+    def touch(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """Record that url was revalidated (304) now, keeping its text; refresh validators if sent."""
+        with self._lock:
+            try:
+                self._db.execute(
+                    "UPDATE pages SET fetched_at = ?, etag = COALESCE(?, etag), "
+                    "last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                    (time.time(), etag, last_modified, url),
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.debug("failed to refresh crawled page %s: %s", url, e)
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict]) -> Dict[str, str]:
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
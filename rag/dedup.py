@@ -0,0 +1,109 @@
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+")
+# Mersenne prime 2^31 - 1: (a * x + b) with a, b, x below it fits in uint64
+_PRIME = np.uint64((1 << 31) - 1)
+
+
+class MinHashIndex:
+    """Finds near-duplicate texts by MinHash signatures over word shingles.
+
+    Each text becomes the set of its ``shingle``-word windows, and its
+    signature keeps the minimum of ``num_perm`` random hash permutations
+    of that set; the fraction of equal signature slots estimates the
+    Jaccard similarity of two texts. Signatures are bucketed by LSH bands
+    of ``rows`` slots, so a lookup only compares texts that share a band
+    (with the defaults, pairs at 0.8 similarity collide with probability
+    above 0.999).
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, rows: int = 4,
+                 shingle: int = 3, seed: int = 1):
+        self.threshold = threshold
+        self.shingle = shingle
+        self.rows = rows
+        self.bands = num_perm // rows
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, int(_PRIME), size=(self.bands * rows, 1)).astype(np.uint64)
+        self._b = rng.randint(0, int(_PRIME), size=(self.bands * rows, 1)).astype(np.uint64)
+        self._signatures: List[np.ndarray] = []
+        self._buckets: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(self.bands)]
+
+    def signature(self, text: str) -> np.ndarray:
+        words = _WORD_RE.findall(text.lower())
+        n = self.shingle
+        shingles = {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles),
+                             dtype=np.uint64, count=len(shingles)) % _PRIME
+        return ((self._a * hashes[None, :] + self._b) % _PRIME).min(axis=1)
+
+    def _bands(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def find_or_add(self, text: str) -> Optional[int]:
+        """Key of an earlier near-duplicate of text, or None after adding text as a new key."""
+        signature = self.signature(text)
+        bands = self._bands(signature)
+        seen = set()
+        for band, key in zip(self._buckets, bands):
+            for other in band.get(key, ()):
+                if other in seen:
+                    continue
+                seen.add(other)
+                if float(np.mean(self._signatures[other] == signature)) >= self.threshold:
+                    return other
+        new = len(self._signatures)
+        self._signatures.append(signature)
+        for band, key in zip(self._buckets, bands):
+            band[key].append(new)
+        return None
+
+
+def dedup_pages(texts: List[str], chunk_spans, threshold: float = 0.8,
+                min_words: int = 8) -> Tuple[List[str], List[List[Tuple[int, int]]], Dict[str, int]]:
+    """Remove content repeated across pages: near-duplicate blocks, then near-duplicate chunks.
+
+    Blocks are the blank-line separated paragraphs of each text; a block
+    of at least ``min_words`` words that nearly repeats an earlier block
+    (Jaccard >= threshold) is dropped, headings are always kept. The
+    remaining text is chunked with ``chunk_spans`` and chunks that nearly
+    repeat an earlier chunk are dropped too. Earlier pages win, so callers
+    should pass pages in a stable order.
+
+    Returns the cleaned texts, the kept (start, end) chunk spans of each
+    and counts of what was removed.
+    """
+    stats = {"blocks": 0, "blocks_removed": 0, "chunks": 0, "chunks_removed": 0,
+             "chars": sum(len(t) for t in texts), "chars_removed": 0}
+    blocks_seen = MinHashIndex(threshold)
+    cleaned = []
+    for text in texts:
+        kept = []
+        for block in text.split("\n\n"):
+            stats["blocks"] += 1
+            if (not block.lstrip().startswith("#") and len(_WORD_RE.findall(block)) >= min_words
+                    and blocks_seen.find_or_add(block) is not None):
+                stats["blocks_removed"] += 1
+                stats["chars_removed"] += len(block)
+                continue
+            kept.append(block)
+        cleaned.append("\n\n".join(kept))
+
+    chunks_seen = MinHashIndex(threshold)
+    kept_spans = []
+    for text in cleaned:
+        spans = []
+        for start, end in chunk_spans(text):
+            stats["chunks"] += 1
+            if chunks_seen.find_or_add(text[start:end]) is not None:
+                stats["chunks_removed"] += 1
+                stats["chars_removed"] += end - start
+                continue
+            spans.append((start, end))
+        kept_spans.append(spans)
+    return cleaned, kept_spans, stats
@@ -0,0 +1,175 @@
+import bisect
+import hashlib
+import logging
+import os
+import time
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.txt', '.md', '.docx')
+
+# passed to process_tables when no CHUNK_MARKER is configured; never matches,
+# so each table stays a single block
+_NO_MARKER = "<!-- no chunk marker -->"
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+PDF_BACKENDS = ("auto", "pymupdf", "pypdf", "pypdf2")
+
+
+def _pdf_pages_pymupdf(path: str) -> List[str]:
+    import fitz
+    with fitz.open(path) as doc:
+        return [page.get_text() for page in doc]
+
+
+def _pdf_pages_pypdf(path: str) -> List[str]:
+    import pypdf
+    return [page.extract_text() or "" for page in pypdf.PdfReader(path).pages]
+
+
+def _pdf_pages_pypdf2(path: str) -> List[str]:
+    import PyPDF2
+    with open(path, 'rb') as pdf_file:
+        return [page.extract_text() or "" for page in PyPDF2.PdfReader(pdf_file).pages]
+
+
+_PDF_EXTRACTORS = {
+    "pymupdf": _pdf_pages_pymupdf,
+    "pypdf": _pdf_pages_pypdf,
+    "pypdf2": _pdf_pages_pypdf2,
+}
+
+
+def pdf_pages(path: str, backend: str = "auto") -> Optional[Tuple[List[str], str]]:
+    """Per-page text of a PDF and the backend that produced it.
+
+    ``auto`` uses the fastest installed library: PyMuPDF, then pypdf, then
+    PyPDF2. Returns None when no backend is installed.
+    """
+    names = ("pymupdf", "pypdf", "pypdf2") if backend == "auto" else (backend,)
+    for name in names:
+        try:
+            return _PDF_EXTRACTORS[name](path), name
+        except ImportError:
+            continue
+    logger.warning("no PDF backend installed (%s); skipping PDF %s", backend, os.path.basename(path))
+    return None
+
+
+def read_docx(path: str, chunk_marker: str = "") -> Optional[str]:
+    """Text of a DOCX with every table replaced by its chunked HTML.
+
+    Tables go through utils.process_tables (a single mammoth conversion per
+    file) and come back as fenced HTML blocks split at ``chunk_marker``,
+    which the structure chunker keeps whole. Word headings become Markdown
+    headings. Everything happens in memory, so workers can run it in parallel.
+    """
+    try:
+        from utils.process_tables import extract_and_replace_docx_tables
+    except ImportError as e:
+        logger.warning("DOCX support needs mammoth and python-docx (%s); skipping %s",
+                       e, os.path.basename(path))
+        return None
+    document, _ = extract_and_replace_docx_tables(path, chunk_marker or _NO_MARKER)
+    parts = []
+    for para in document.paragraphs:
+        text = para.text.strip()
+        if not text:
+            continue
+        style = para.style.name if para.style is not None else ""
+        level = style[len("Heading"):].strip()
+        if style.startswith("Heading") and level.isdigit():
+            text = "#" * min(int(level), 6) + " " + text
+        parts.append(text)
+    return "\n\n".join(parts)
+
+
+def read_document(path: str, pdf_backend: str = "auto",
+                  chunk_marker: str = "") -> Optional[Tuple[str, List[int]]]:
+    """Text of a supported file and the offset where each page starts.
+
+    PDF pages are joined once with a form feed, which the structure chunker
+    treats as a hard boundary; other files are a single page at offset 0.
+    None if unsupported or unreadable.
+    """
+    fn = os.path.basename(path)
+    file_ext = os.path.splitext(fn)[1].lower()
+    if file_ext == '.pdf':
+        extracted = pdf_pages(path, pdf_backend)
+        if extracted is None:
+            return None
+        pages, _ = extracted
+        offsets = []
+        pos = 0
+        for page in pages:
+            offsets.append(pos)
+            pos += len(page) + 1
+        return "\f".join(pages), offsets
+    if file_ext == '.docx':
+        txt = read_docx(path, chunk_marker)
+        return (txt, [0]) if txt is not None else None
+    if file_ext in ['.txt', '.md']:
+        # Handle TXT and MD files with fallback encodings
+        for encoding in ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252', 'iso-8859-1']:
+            try:
+                with open(path, "r", encoding=encoding) as f:
+                    return f.read(), [0]
+            except (UnicodeDecodeError, UnicodeError):
+                continue
+        logger.warning(f"Could not read {fn} with any encoding; skipping")
+        return None
+    logger.debug(f"Skipping unsupported file type: {fn}")
+    return None
+
+
+def read_file(path: str, pdf_backend: str = "auto", chunk_marker: str = "") -> Optional[str]:
+    """Extract text from a supported file; None if unsupported or unreadable."""
+    doc = read_document(path, pdf_backend, chunk_marker)
+    return doc[0] if doc is not None else None
+
+
+def parse_file(path: str, old_digest: Optional[str], chunker, pdf_backend: str = "auto",
+               chunk_marker: str = "") -> dict:
+    """Hash, read and chunk one file; runs inside an ingestion worker process.
+
+    Returns {"sha256", "unchanged"} when the content hash matches
+    old_digest. Otherwise the result also has "chunks", "spans" (None
+    chunks when the file could not be read), "pages" as [offset, page hash]
+    pairs, "chunk_pages" (the page of each chunk) and "seconds" spent
+    reading and chunking. On failure it is {"error"}.
+    """
+    started = time.perf_counter()
+    try:
+        digest = file_digest(path)
+        if old_digest == digest:
+            return {"sha256": digest, "unchanged": True}
+        doc = read_document(path, pdf_backend, chunk_marker)
+    except Exception as e:
+        return {"error": str(e)}
+    if doc is None:
+        return {"sha256": digest, "unchanged": False, "chunks": None, "spans": []}
+    txt, offsets = doc
+    bounds = offsets[1:] + [len(txt) + 1]
+    pages = [
+        [start, hashlib.sha1(txt[start:end - 1].encode("utf-8", "surrogatepass")).hexdigest()]
+        for start, end in zip(offsets, bounds)
+    ]
+    spans = chunker.split(txt)
+    return {
+        "sha256": digest,
+        "unchanged": False,
+        "chunks": [txt[start:end] for start, end in spans],
+        "spans": spans,
+        "pages": pages,
+        "chunk_pages": [bisect.bisect_right(offsets, start) - 1 for start, _ in spans],
+        "seconds": time.perf_counter() - started,
+    }
@@ -0,0 +1,142 @@
+import logging
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive cache key for a query."""
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU of normalized query -> normalized float32 vector.
+
+    When ``path`` is set, entries are also written to a small SQLite file
+    (keyed by embedding model) so the cache survives restarts; memory misses
+    fall through to disk before the model is called. Disk writes are queued
+    and committed in batches by a daemon thread, off the request path.
+    """
+
+    # a writer batch is committed once this many entries are waiting or
+    # after FLUSH_INTERVAL seconds
+    MAX_WRITE_BATCH = 256
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, model_name: str, capacity: int = 4096, path: Optional[str] = None):
+        self.model_name = model_name
+        self.capacity = capacity
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        # guards the SQLite connection only, so memory hits never wait on disk
+        self._db_lock = threading.Lock()
+        self._writes: "queue.Queue" = queue.Queue()
+        self._writer = None
+        self._db = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                    "model TEXT NOT NULL, query TEXT NOT NULL, vector BLOB NOT NULL, "
+                    "PRIMARY KEY (model, query))"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning("query embedding cache disabled on disk (%s): %s", path, e)
+                self._db = None
+            else:
+                self._writer = threading.Thread(target=self._write_loop, name="query-cache-writer", daemon=True)
+                self._writer.start()
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        key = normalize_query(query)
+        with self._lock:
+            vec = self._entries.get(key)
+            if vec is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vec
+        if self._db is not None:
+            try:
+                with self._db_lock:
+                    row = self._db.execute(
+                        "SELECT vector FROM query_embeddings WHERE model = ? AND query = ?",
+                        (self.model_name, key),
+                    ).fetchone()
+            except sqlite3.Error as e:
+                logger.debug("failed to read query embedding: %s", e)
+                row = None
+            if row is not None:
+                vec = np.frombuffer(row[0], dtype="float32").reshape(1, -1)
+                with self._lock:
+                    self._remember(key, vec)
+                    self.disk_hits += 1
+                return vec
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, query: str, vector: np.ndarray):
+        key = normalize_query(query)
+        vec = np.array(vector, dtype="float32").reshape(1, -1)
+        vec.flags.writeable = False
+        with self._lock:
+            self._remember(key, vec)
+        if self._db is not None:
+            self._writes.put((self.model_name, key, vec.tobytes()))
+
+    def flush(self):
+        """Block until every queued entry is on disk."""
+        if self._db is not None:
+            self._writes.join()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._writes.get()]
+            deadline = time.perf_counter() + self.FLUSH_INTERVAL
+            while len(batch) < self.MAX_WRITE_BATCH:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self._writes.get(timeout=remaining) if remaining > 0 else self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self._db_lock:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO query_embeddings (model, query, vector) VALUES (?, ?, ?)",
+                        batch,
+                    )
+                    self._db.commit()
+            except sqlite3.Error as e:
+                logger.debug("failed to persist %d query embeddings: %s", len(batch), e)
+            for _ in batch:
+                self._writes.task_done()
+
+    def _remember(self, key: str, vec: np.ndarray):
+        self._entries[key] = vec
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,323 @@
+import bisect
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from rag import ann, lexical, linear_search
+
+try:
+    import faiss
+except Exception:
+    faiss = None
+
+logger = logging.getLogger(__name__)
+
+
+class IndexGeneration:
+    """One complete, self-consistent version of the searchable index.
+
+    A generation bundles the chunk texts, their ids and vectors, the FAISS
+    index and the file manifest. Readers grab a reference to the current
+    generation once per query; writers fork it, mutate the fork and publish
+    it with a single reference swap, so a query never sees new docs paired
+    with an old index.
+    """
+
+    def __init__(self, number: int = 0, index_params: Optional[dict] = None):
+        self.number = number
+        self.index_params = index_params or {"type": "flat"}
+        self.docs: List[str] = []
+        # float32 rows, or a linear_search.QuantizedMatrix when searched without faiss
+        self.embeddings = None
+        self.doc_ids = np.zeros(0, dtype="int64")
+        self.id_to_row: Dict[int, int] = {}
+        self.next_id = 0
+        self.index = None
+        # True when self.index is shared with another generation or is a
+        # read-only memory map, and so must be copied before mutation.
+        self.index_shared = False
+        self.manifest: Dict[str, dict] = {}
+        self.manifest_root: Optional[str] = None
+        # chunk id -> term frequencies, kept so the BM25 index can be rebuilt
+        # for each generation without re-tokenizing unchanged chunks
+        self.chunk_terms: Dict[int, Dict[str, int]] = {}
+        self.lexical: Optional[lexical.BM25Index] = None
+        # the parent's BM25 index and the doc ids it was built for; build_lexical
+        # updates it for the rows that changed instead of rebuilding it
+        self._lexical_base: Optional[Tuple[lexical.BM25Index, np.ndarray]] = None
+        # chunk id -> (source, start, end): where the chunk text sits in its
+        # source document, used to stitch overlapping hits back together
+        self.chunk_spans: Dict[int, Tuple[str, int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def fork(self) -> "IndexGeneration":
+        """Copy-on-write successor; arrays are shared until replaced."""
+        gen = IndexGeneration(self.number + 1, self.index_params)
+        gen.docs = list(self.docs)
+        gen.embeddings = self.embeddings
+        gen.doc_ids = self.doc_ids
+        gen.id_to_row = dict(self.id_to_row)
+        gen.next_id = self.next_id
+        gen.index = self.index
+        gen.index_shared = self.index is not None
+        gen.manifest = {rel: dict(entry) for rel, entry in self.manifest.items()}
+        gen.manifest_root = self.manifest_root
+        gen.chunk_terms = dict(self.chunk_terms)
+        gen.chunk_spans = dict(self.chunk_spans)
+        if self.lexical is not None:
+            gen._lexical_base = (self.lexical, self.doc_ids)
+        return gen
+
+    def rebuild_index(self):
+        """Build a fresh index of the configured type from the vectors we hold."""
+        if faiss is None or self.embeddings is None or len(self.embeddings) == 0:
+            self.index = None
+        else:
+            self.index = ann.make_index(self.embeddings, self.doc_ids, self.index_params)
+        self.index_shared = False
+
+    def writable_index(self):
+        """Return an index that may be mutated in place.
+
+        A shared or memory-mapped index is copied first: flat indexes are
+        refilled from the vectors we already hold (a memcpy, not a
+        re-embedding); trained indexes are copied so their centroids and
+        codebooks are kept.
+        """
+        if self.index is not None and self.index_shared:
+            if self.index_params["type"] == "flat":
+                self.rebuild_index()
+            else:
+                try:
+                    # a serialize round-trip always yields an owned, writable
+                    # copy; clone_index keeps mmapped inverted lists read-only
+                    self.index = faiss.deserialize_index(faiss.serialize_index(self.index))
+                    ann.set_search_params(self.index, self.index_params)
+                    self.index_shared = False
+                except Exception:
+                    self.rebuild_index()
+        return self.index
+
+    def add_chunks(self, texts: List[str], embs: np.ndarray,
+                   spans: Optional[List[Tuple[str, int, int]]] = None,
+                   update_index: bool = True) -> List[int]:
+        """Append chunks and return their new ids.
+
+        With ``update_index=False`` only the stored vectors grow; the caller
+        builds the index once afterwards with rebuild_index(), e.g. so a
+        trained index is not trained on the first small batch alone.
+        """
+        ids = np.arange(self.next_id, self.next_id + len(texts), dtype="int64")
+        self.next_id += len(texts)
+        index = None
+        if faiss is not None and update_index and self.index is not None:
+            # copy a shared index before the rows grow: a flat copy is refilled
+            # from the stored vectors and must not already hold the new ones
+            index = self.writable_index()
+        base = len(self.docs)
+        self.docs.extend(texts)
+        if self.embeddings is None or len(self.embeddings) == 0:
+            self.embeddings = embs
+        else:
+            self.embeddings = linear_search.append_rows(self.embeddings, embs)
+        if faiss is None:
+            # no index: the matrix itself is what gets searched, so store it compactly
+            self.embeddings = linear_search.compress(self.embeddings, self.index_params.get("fallback_dtype", "float32"))
+        self.doc_ids = linear_search.grow_rows(self.doc_ids, ids)
+        for offset, i in enumerate(ids):
+            self.id_to_row[int(i)] = base + offset
+        if self.index_params.get("lexical_enabled"):
+            for i, text in zip(ids, texts):
+                self.chunk_terms[int(i)] = lexical.term_frequencies(text)
+        if spans is not None:
+            for i, span in zip(ids, spans):
+                if span is not None:
+                    self.chunk_spans[int(i)] = (span[0], int(span[1]), int(span[2]))
+        if faiss is not None and update_index:
+            if self.index is None:
+                # first batch also trains the index when the type needs it
+                self.index = ann.make_index(embs, ids, self.index_params)
+                self.index_shared = False
+            else:
+                index.add_with_ids(embs, ids)
+            if self.index.ntotal != len(self.docs):
+                logger.warning(f"Index holds {self.index.ntotal} vectors for {len(self.docs)} chunks; rebuilding it")
+                self.rebuild_index()
+        return [int(i) for i in ids]
+
+    def remove_chunks(self, ids: List[int]):
+        if not ids:
+            return
+        drop = np.asarray(ids, dtype="int64")
+        rebuild = False
+        if faiss is not None and self.index is not None:
+            if ann.supports_remove(self.index):
+                self.writable_index().remove_ids(drop)
+            else:
+                rebuild = True
+        for i in ids:
+            self.chunk_terms.pop(int(i), None)
+            self.chunk_spans.pop(int(i), None)
+        keep = ~np.isin(self.doc_ids, drop)
+        self.docs = [d for d, k in zip(self.docs, keep) if k]
+        self.embeddings = self.embeddings[keep]
+        self.doc_ids = self.doc_ids[keep]
+        self.id_to_row = {int(i): row for row, i in enumerate(self.doc_ids)}
+        if rebuild:
+            logger.info("Index type cannot remove vectors; rebuilding it from stored embeddings")
+            self.rebuild_index()
+        if not self.docs:
+            self.embeddings = None
+            self.index = None
+            self.index_shared = False
+
+    def build_lexical(self):
+        """(Re)build the BM25 postings for the current rows; call before publishing."""
+        base, self._lexical_base = self._lexical_base, None
+        if not self.index_params.get("lexical_enabled") or not self.docs:
+            self.lexical = None
+            return
+        if base is not None:
+            index, old_ids = base
+            keep = np.isin(old_ids, self.doc_ids)
+            kept = int(keep.sum())
+            # rows are only ever dropped or appended, so the parent's postings
+            # can be renumbered rather than rebuilt
+            if np.array_equal(self.doc_ids[:kept], old_ids[keep]):
+                added = [self._term_frequencies(row) for row in range(kept, len(self.docs))]
+                self.lexical = index.updated(keep, added)
+                return
+        term_freqs = [self._term_frequencies(row) for row in range(len(self.docs))]
+        self.lexical = lexical.BM25Index(term_freqs, k1=self.index_params["bm25_k1"], b=self.index_params["bm25_b"])
+
+    def _term_frequencies(self, row: int) -> Dict[str, int]:
+        doc_id = int(self.doc_ids[row])
+        tf = self.chunk_terms.get(doc_id)
+        if tf is None:
+            # e.g. chunks restored from a snapshot
+            tf = self.chunk_terms[doc_id] = lexical.term_frequencies(self.docs[row])
+        return tf
+
+    def page_label(self, source: str, start: int, end: int) -> Optional[str]:
+        """"name.pdf, p. 3" for a span of a PDF source with recorded page offsets."""
+        entry = self.manifest.get(source)
+        if not entry or not entry.get("pages") or not source.lower().endswith(".pdf"):
+            return None
+        offsets = [offset for offset, _ in entry["pages"]]
+        first = bisect.bisect_right(offsets, start)
+        last = bisect.bisect_right(offsets, max(start, end - 1))
+        name = os.path.basename(source)
+        return f"{name}, p. {first}" if first == last else f"{name}, pp. {first}-{last}"
+
+    def merge_hits(self, hits: List[Tuple[int, float]], max_gap: Optional[int] = 0) -> List[Tuple[str, float]]:
+        """Turn ranked (row, score) hits into (text, score) passages.
+
+        Hits from the same source whose spans overlap, or are separated by at
+        most ``max_gap`` characters, are stitched into one contiguous passage
+        so the overlap text appears once (``max_gap=None`` disables this). A
+        merged passage takes the rank and score of its best member; hits
+        without span info pass through as is. Passages from PDFs are
+        prefixed with their page citation.
+        """
+        passages = []  # [rank, text, score, source, start, end]
+        by_source: Dict[str, list] = {}
+        for rank, (row, score) in enumerate(hits):
+            span = self.chunk_spans.get(int(self.doc_ids[row]))
+            if span is None:
+                passages.append([rank, self.docs[row], score, None, 0, 0])
+            elif max_gap is None:
+                passages.append([rank, self.docs[row], score, span[0], span[1], span[2]])
+            else:
+                by_source.setdefault(span[0], []).append((span[1], span[2], rank, row, score))
+        for source, items in by_source.items():
+            items.sort()
+            current = None
+            for start, end, rank, row, score in items:
+                text = self.docs[row]
+                if current is not None and start <= current[5] + max_gap:
+                    if end > current[5]:
+                        if start >= current[5]:
+                            current[1] += ("\n" if start > current[5] else "") + text
+                        else:
+                            current[1] += text[current[5] - start:]
+                        current[5] = end
+                    current[0] = min(current[0], rank)
+                    current[2] = max(current[2], score)
+                    continue
+                if current is not None:
+                    passages.append(current)
+                current = [rank, text, score, source, start, end]
+            passages.append(current)
+        passages.sort(key=lambda p: p[0])
+        if len(passages) < len(hits):
+            logger.debug(f"Merged {len(hits)} hits into {len(passages)} passages")
+        results = []
+        for _, text, score, source, start, end in passages:
+            label = self.page_label(source, start, end) if source is not None else None
+            results.append((f"[{label}]\n{text}" if label else text, score))
+        return results
+
+    def _dense_scores(self, q: np.ndarray, rows: List[int]) -> np.ndarray:
+        vecs = np.asarray(self.embeddings[np.asarray(rows, dtype="int64")], dtype="float32")
+        return vecs @ q.reshape(-1)
+
+    def search(self, q: np.ndarray, top_k: int, query: Optional[str] = None) -> List[Tuple[int, float]]:
+        """Return (row, score) pairs for a single L2-normalised query row."""
+        return self.search_many(q, top_k, [query] if query is not None else None)[0]
+
+    def search_many(self, Q: np.ndarray, top_k: int,
+                    queries: Optional[List[str]] = None) -> List[List[Tuple[int, float]]]:
+        """Search all rows of Q at once: one FAISS call or one matrix multiply.
+
+        When query texts are given and the BM25 index is built, each query's
+        dense candidates are fused with its lexical hits. Reported scores
+        are always the dense cosine of the chunk, so the similarity
+        threshold keeps its meaning.
+        """
+        if self.embeddings is None or len(self.embeddings) == 0:
+            return [[] for _ in range(len(Q))]
+        hybrid = queries is not None and self.lexical is not None
+        depth = max(top_k, self.index_params.get("hybrid_candidates", top_k)) if hybrid else top_k
+        dense = self._dense_search(Q, depth)
+        if not hybrid:
+            return dense
+        results = []
+        for q, query, dense_hits in zip(Q, queries, dense):
+            lex_hits = self.lexical.search(query, depth)
+            if not lex_hits:
+                results.append(dense_hits[:top_k])
+                continue
+            rows = lexical.fuse(
+                dense_hits, lex_hits,
+                method=self.index_params["fusion"],
+                lexical_weight=self.index_params["lexical_weight"],
+                rrf_k=self.index_params["rrf_k"],
+            )[:top_k]
+            known = dict(dense_hits)
+            missing = [r for r in rows if r not in known]
+            if missing:
+                known.update(zip(missing, (float(x) for x in self._dense_scores(q, missing))))
+            results.append([(r, known[r]) for r in rows])
+        return results
+
+    def _dense_search(self, Q: np.ndarray, top_k: int) -> List[List[Tuple[int, float]]]:
+        if self.index is None:
+            # fallback linear search
+            scores, rows = linear_search.topk_inner_product(
+                self.embeddings, Q, top_k, self.index_params.get("fallback_block_rows", 65536))
+            return [[(int(r), float(sc)) for sc, r in zip(srow, rrow)] for srow, rrow in zip(scores, rows)]
+        D, I = self.index.search(np.ascontiguousarray(Q, dtype="float32"), top_k)
+        results = []
+        for scores, doc_ids in zip(D, I):
+            hits = []
+            for score, doc_id in zip(scores, doc_ids):
+                row = self.id_to_row.get(int(doc_id))
+                if row is None:
+                    continue
+                hits.append((row, float(score)))
+            results.append(hits)
+        return results
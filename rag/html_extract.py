@@ -0,0 +1,239 @@
+import logging
+import re
+import warnings
+from collections import Counter
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urljoin
+
+logger = logging.getLogger(__name__)
+
+HTML_PARSERS = ("auto", "lxml", "bs4")
+
+# subtrees that never hold page content; their links are still collected
+_SKIP_TAGS = frozenset((
+    "head", "script", "style", "noscript", "template", "svg", "iframe", "canvas",
+    "nav", "footer", "aside", "button", "select", "dialog",
+))
+# page containers: skipping one would drop the whole page, whatever its attributes
+_NEVER_SKIP = frozenset(("html", "body", "main"))
+_SKIP_ROLES = frozenset(("navigation", "banner", "contentinfo", "search", "dialog", "alertdialog"))
+# a whole class token or id of cookie banners and other chrome that is not in a
+# <nav> or <footer>; "cookies-not-set" or "has-navbar-fixed-top" do not match
+_CHROME_RE = re.compile(
+    r"(cookie|consent|gdpr)([-_](banner|notice|bar|popup|consent|law|container|wrapper))*"
+    r"|breadcrumbs?|skip-link|share-buttons|social-share|navbar|back-to-top",
+    re.I,
+)
+_BLOCK_TAGS = frozenset((
+    "p", "div", "section", "article", "main", "header", "li", "ul", "ol", "dl", "dt", "dd",
+    "table", "tr", "caption", "blockquote", "pre", "figure", "figcaption",
+    "address", "br", "hr", "summary", "details",
+))
+_HEADINGS = {f"h{n}": n for n in range(1, 7)}
+# cells stay on their row's line
+_CELL_TAGS = frozenset(("td", "th"))
+
+
+class Section(NamedTuple):
+    """A heading (empty for text before the first heading) and the blocks under it."""
+    heading: str
+    level: int
+    blocks: List[str]
+
+
+def _is_boilerplate(tag: str, attrs) -> bool:
+    if tag in _NEVER_SKIP:
+        return False
+    if tag in _SKIP_TAGS:
+        return True
+    if attrs.get("hidden") is not None or attrs.get("aria-hidden") == "true":
+        return True
+    if attrs.get("role") in _SKIP_ROLES:
+        return True
+    names = attrs.get("class") or ""
+    if isinstance(names, str):  # bs4 gives class as a list
+        names = names.split()
+    return any(_CHROME_RE.fullmatch(name) for name in [*names, attrs.get("id") or ""])
+
+
+class _SectionBuilder:
+    """Turns one stream of start / end / text events into sections and links.
+
+    Parser backends walk the document once and feed it events. Boilerplate
+    subtrees are tracked by depth rather than removed, so their links are
+    still collected while their text is dropped in the same pass.
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.links: List[str] = []
+        self.sections: List[Section] = [Section("", 0, [])]
+        self._skip_depth = 0
+        self._pieces: List[str] = []
+        self._pre = 0
+        self._heading_level = 0
+
+    def start(self, tag: str, attrs):
+        if tag == "a":
+            href = (attrs.get("href") or "").strip()
+            if href and not href.startswith("#"):
+                self.links.append(urljoin(self.base_url, href))
+        if self._skip_depth or _is_boilerplate(tag, attrs):
+            if not self._skip_depth:
+                self._flush()
+            self._skip_depth += 1
+            return
+        if tag in _HEADINGS:
+            self._flush()
+            self._heading_level = _HEADINGS[tag]
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+            if tag == "pre":
+                self._pre += 1
+        elif tag in _CELL_TAGS and "".join(self._pieces).strip():
+            self._pieces.append(" | ")
+
+    def end(self, tag: str):
+        if self._skip_depth:
+            self._skip_depth -= 1
+            return
+        if tag in _HEADINGS and self._heading_level:
+            heading = " ".join("".join(self._pieces).split())
+            self._pieces = []
+            if heading:
+                self.sections.append(Section(heading, self._heading_level, []))
+            self._heading_level = 0
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+            if tag == "pre":
+                self._pre -= 1
+
+    def text(self, data: str):
+        if data and not self._skip_depth:
+            self._pieces.append(data)
+
+    def _flush(self):
+        if not self._pieces or self._heading_level:
+            return
+        raw = "".join(self._pieces)
+        self._pieces = []
+        block = raw.strip("\n") if self._pre else " ".join(raw.split())
+        if block.strip():
+            self.sections[-1].blocks.append(block)
+
+    def result(self) -> Tuple[List[Section], List[str]]:
+        self._heading_level = 0
+        self._flush()
+        return [s for s in self.sections if s.heading or s.blocks], self.links
+
+
+def _walk_lxml(html, builder: _SectionBuilder):
+    import lxml.html
+    from lxml import etree
+    # comments and processing instructions are dropped with their text
+    # merged into the surrounding element
+    parser = lxml.html.HTMLParser(remove_comments=True, remove_pis=True)
+    root = lxml.html.fromstring(html, parser=parser)
+    for event, el in etree.iterwalk(root, events=("start", "end")):
+        if not isinstance(el.tag, str):
+            continue
+        tag = el.tag.lower()
+        if event == "start":
+            builder.start(tag, el.attrib)
+            if el.text:
+                builder.text(el.text)
+        else:
+            builder.end(tag)
+            if el.tail:
+                builder.text(el.tail)
+
+
+def _walk_bs4(html, builder: _SectionBuilder):
+    from bs4 import BeautifulSoup, NavigableString, Tag
+    from bs4.element import PreformattedString
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        soup = BeautifulSoup(html, "html.parser")
+    stack = [(soup, False)]
+    while stack:
+        node, leaving = stack.pop()
+        if leaving:
+            builder.end(node.name)
+        elif isinstance(node, Tag):
+            if node is not soup:
+                builder.start(node.name, node.attrs)
+                stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.contents))
+        elif isinstance(node, NavigableString) and not isinstance(node, PreformattedString):
+            builder.text(str(node))
+
+
+_WALKERS: Dict[str, Callable] = {
+    "lxml": _walk_lxml,
+    "bs4": _walk_bs4,
+}
+
+
+def extract_sections(html, base_url: str, parser: str = "auto") -> Tuple[List[Section], List[str]]:
+    """Content sections and absolute link targets of a page, from a single pass.
+
+    ``auto`` uses lxml when installed and BeautifulSoup's html.parser
+    otherwise; a document lxml cannot parse is retried with bs4.
+    """
+    if parser != "auto" and parser not in _WALKERS:
+        logger.warning(f"Unknown HTML_PARSER {parser!r}; using auto")
+        parser = "auto"
+    names = ("lxml", "bs4") if parser == "auto" else (parser,)
+    error: Optional[Exception] = None
+    for name in names:
+        builder = _SectionBuilder(base_url)
+        try:
+            _WALKERS[name](html, builder)
+        except ImportError:
+            continue
+        except Exception as e:
+            error = e
+            continue
+        return builder.result()
+    if error is not None:
+        logger.debug("could not parse HTML from %s: %s", base_url, error)
+    return [], []
+
+
+def sections_to_text(sections: List[Section]) -> str:
+    """Sections as Markdown: ``#`` headings and blank-line separated blocks, for the structure chunker."""
+    parts = []
+    for section in sections:
+        if section.heading:
+            parts.append("#" * section.level + " " + section.heading)
+        parts.extend(section.blocks)
+    return "\n\n".join(parts)
+
+
+def remove_site_chrome(texts: List[str], min_pages: int = 3, min_share: float = 0.5) -> Tuple[List[str], int]:
+    """Keep only the first copy of blocks repeated verbatim across pages, e.g. sidebars.
+
+    A block (blank-line separated, as written by sections_to_text) counts
+    as site chrome when it appears on at least ``min_share`` of the pages
+    and on at least ``min_pages`` of them. It stays on the first page that
+    has it, so it is still indexed once, and is dropped from the others;
+    callers should pass pages in a stable order. Returns the cleaned texts
+    and the number of distinct repeated blocks.
+    """
+    if len(texts) < min_pages:
+        return texts, 0
+    counts = Counter()
+    for text in texts:
+        counts.update(set(text.split("\n\n")))
+    threshold = max(min_pages, min_share * len(texts))
+    chrome = {block for block, n in counts.items() if n >= threshold and block.strip()}
+    if not chrome:
+        return texts, 0
+    cleaned = []
+    kept = set()
+    for text in texts:
+        blocks = text.split("\n\n")
+        first = {b for b in blocks if b in chrome and b not in kept}
+        kept |= first
+        cleaned.append("\n\n".join(b for b in blocks if b not in chrome or b in first))
+    return cleaned, len(chrome)
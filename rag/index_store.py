@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+from contextlib import contextmanager
+from typing import List, Optional, Dict, Any
+
+import numpy as np
+
+try:
+    import faiss
+except Exception:
+    faiss = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the on-disk layout changes so old snapshots are ignored.
+SNAPSHOT_VERSION = 2
+
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+META_FILE = "meta.json"
+DOCS_FILE = "docs.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+INDEX_FILE = "index.faiss"
+IDS_FILE = "ids.npy"
+MANIFEST_FILE = "manifest.json"
+SPANS_FILE = "spans.json"
+
+
+def snapshot_key(model_name: str, chunk_size: int, overlap: int, chunker: str = "fixed",
+                 source: str = "") -> str:
+    """Stable directory name for a given embedding model, chunking setup and source.
+
+    source (the ingested folder or crawled base URL) keeps each source in its
+    own directory, so saving one never prunes another's snapshot.
+    """
+    raw = f"v{SNAPSHOT_VERSION}|{model_name}|{chunk_size}|{overlap}|{chunker}|{source}"
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+    safe_model = "".join(c if c.isalnum() or c in "-_." else "_" for c in model_name)
+    return f"{safe_model}-{digest}"
+
+
+def _read_index(path: str):
+    """Read a FAISS index, memory-mapping it when this faiss build supports it."""
+    for flag_name in ("IO_FLAG_MMAP_IFC", "IO_FLAG_MMAP"):
+        flag = getattr(faiss, flag_name, None)
+        if flag is None:
+            continue
+        try:
+            return faiss.read_index(path, flag)
+        except Exception:
+            continue
+    return faiss.read_index(path)
+
+
+def save_snapshot(root: str, key: str, docs: List[str], embeddings: np.ndarray,
+                  index=None, ids: Optional[np.ndarray] = None,
+                  manifest: Optional[Dict[str, Any]] = None,
+                  spans: Optional[List[Any]] = None,
+                  meta: Optional[Dict[str, Any]] = None) -> str:
+    """Write a new snapshot generation and atomically point CURRENT at it.
+
+    Each save goes into a fresh ``gen-*`` directory; readers only ever follow
+    ``CURRENT``, which is swapped with ``os.replace`` once every file is on disk.
+    Returns the generation directory.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    key_dir = os.path.join(root, key)
+    os.makedirs(key_dir, exist_ok=True)
+    gen_name = f"gen-{int(time.time() * 1000)}-{os.getpid()}"
+    tmp_dir = os.path.join(key_dir, f".{gen_name}.tmp")
+    os.makedirs(tmp_dir)
+
+    try:
+        with open(os.path.join(tmp_dir, DOCS_FILE), "w", encoding="utf-8") as f:
+            json.dump(docs, f, ensure_ascii=False)
+        np.save(os.path.join(tmp_dir, EMBEDDINGS_FILE), embeddings)
+        if ids is None:
+            ids = np.arange(len(docs), dtype="int64")
+        np.save(os.path.join(tmp_dir, IDS_FILE), np.asarray(ids, dtype="int64"))
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest or {}, f)
+        with open(os.path.join(tmp_dir, SPANS_FILE), "w", encoding="utf-8") as f:
+            json.dump(spans or [], f, ensure_ascii=False)
+        has_index = index is not None and faiss is not None
+        if has_index:
+            faiss.write_index(index, os.path.join(tmp_dir, INDEX_FILE))
+        full_meta = dict(meta or {})
+        full_meta.update({
+            "version": SNAPSHOT_VERSION,
+            "key": key,
+            "count": len(docs),
+            "dim": int(embeddings.shape[1]) if embeddings.ndim == 2 else 0,
+            "has_index": has_index,
+            "created": time.time(),
+        })
+        with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(full_meta, f)
+
+        gen_dir = os.path.join(key_dir, gen_name)
+        # publish and prune under one lock, so a concurrent save never
+        # deletes the generation another worker has just pointed CURRENT at
+        with _key_lock(key_dir):
+            os.rename(tmp_dir, gen_dir)
+            pointer_tmp = os.path.join(key_dir, f".{CURRENT_FILE}.{os.getpid()}")
+            with open(pointer_tmp, "w", encoding="utf-8") as f:
+                f.write(gen_name)
+            os.replace(pointer_tmp, os.path.join(key_dir, CURRENT_FILE))
+            _prune_generations(key_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    logger.info(f"Saved index snapshot {key}/{gen_name} ({len(docs)} chunks)")
+    return gen_dir
+
+
+@contextmanager
+def _key_lock(key_dir: str):
+    """Exclusive lock on a key directory across processes (no-op without fcntl)."""
+    with open(os.path.join(key_dir, LOCK_FILE), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _prune_generations(key_dir: str):
+    # Workers that already mmapped an old generation keep their pages until
+    # they exit; unlinking the files does not invalidate those mappings.
+    # CURRENT is re-read so the live generation is never removed.
+    try:
+        with open(os.path.join(key_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            keep = f.read().strip()
+    except FileNotFoundError:
+        return
+    for name in os.listdir(key_dir):
+        if name.startswith("gen-") and name != keep:
+            shutil.rmtree(os.path.join(key_dir, name), ignore_errors=True)
+
+
+def load_snapshot(root: str, key: str, mmap: bool = True) -> Optional[Dict[str, Any]]:
+    """Load the current snapshot for ``key``, or return None if there is none.
+
+    With ``mmap`` the embedding matrix (and the FAISS index where supported)
+    are memory-mapped read-only so every worker shares the same page cache.
+    """
+    key_dir = os.path.join(root, key)
+    try:
+        with open(os.path.join(key_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            gen_name = f.read().strip()
+    except FileNotFoundError:
+        return None
+
+    gen_dir = os.path.join(key_dir, gen_name)
+    try:
+        with open(os.path.join(gen_dir, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != SNAPSHOT_VERSION or meta.get("key") != key:
+            logger.info(f"Ignoring snapshot {gen_dir}: version/key mismatch")
+            return None
+        with open(os.path.join(gen_dir, DOCS_FILE), "r", encoding="utf-8") as f:
+            docs = json.load(f)
+        embeddings = np.load(os.path.join(gen_dir, EMBEDDINGS_FILE), mmap_mode="r" if mmap else None)
+        ids = np.load(os.path.join(gen_dir, IDS_FILE))
+        with open(os.path.join(gen_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        spans = []
+        spans_path = os.path.join(gen_dir, SPANS_FILE)
+        if os.path.exists(spans_path):
+            # older snapshots have no spans; their chunks are just never merged
+            with open(spans_path, "r", encoding="utf-8") as f:
+                spans = json.load(f)
+        index = None
+        if meta.get("has_index") and faiss is not None:
+            index_path = os.path.join(gen_dir, INDEX_FILE)
+            index = _read_index(index_path) if mmap else faiss.read_index(index_path)
+    except Exception as e:
+        logger.warning(f"Failed to load snapshot {gen_dir}: {e}")
+        return None
+
+    if len(docs) != meta.get("count") or len(embeddings) != len(docs) or len(ids) != len(docs):
+        logger.warning(f"Snapshot {gen_dir} is inconsistent; ignoring")
+        return None
+
+    return {"meta": meta, "docs": docs, "embeddings": embeddings, "index": index,
+            "ids": ids, "manifest": manifest, "spans": spans, "path": gen_dir}
@@ -0,0 +1,173 @@
+import logging
+import re
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Keeps call numbers (QA76.73), ISBNs (978-0-13-110362-7), room numbers
+# (B-204), emails and database names together as single tokens.
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.\-@/_:][a-z0-9]+)*")
+_SEPARATORS_RE = re.compile(r"[.\-@/_:]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms; compound tokens also emit their parts and a joined form."""
+    terms = []
+    for tok in _TOKEN_RE.findall((text or "").lower()):
+        terms.append(tok)
+        if _SEPARATORS_RE.search(tok):
+            parts = [p for p in _SEPARATORS_RE.split(tok) if p]
+            terms.append("".join(parts))  # "978-0-13" also matches "978013"
+            terms.extend(parts)
+    return terms
+
+
+def term_frequencies(text: str) -> Dict[str, int]:
+    return dict(Counter(tokenize(text)))
+
+
+class BM25Index:
+    """Okapi BM25 over compact CSR-style postings arrays.
+
+    For term t, postings live in ``rows[offsets[t]:offsets[t + 1]]`` with
+    matching term frequencies in ``tfs``. Rows are positions in the owning
+    generation's docs list.
+    """
+
+    def __init__(self, term_freqs: Iterable[Dict[str, int]], k1: float = 1.2, b: float = 0.75):
+        started = time.perf_counter()
+        self.k1 = k1
+        self.b = b
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = []
+        for row, tf in enumerate(term_freqs):
+            lengths.append(sum(tf.values()))
+            for term, count in tf.items():
+                postings.setdefault(term, []).append((row, count))
+
+        self.doc_len = np.asarray(lengths, dtype="float32")
+        self.vocab: Dict[str, int] = {}
+        offsets = [0]
+        rows: List[int] = []
+        tfs: List[int] = []
+        for term_id, (term, plist) in enumerate(postings.items()):
+            self.vocab[term] = term_id
+            for row, count in plist:
+                rows.append(row)
+                tfs.append(count)
+            offsets.append(len(rows))
+        self.offsets = np.asarray(offsets, dtype="int64")
+        self.rows = np.asarray(rows, dtype="int32")
+        self.tfs = np.asarray(tfs, dtype="float32")
+        self._finish()
+        logger.info(
+            f"Built BM25 index: {self.n_docs} chunks, {len(self.vocab)} terms, "
+            f"{len(self.rows)} postings in {time.perf_counter() - started:.2f}s"
+        )
+
+    def _finish(self):
+        self.n_docs = len(self.doc_len)
+        self.avgdl = float(self.doc_len.mean()) if self.n_docs else 0.0
+        df = np.diff(self.offsets).astype("float32")
+        self.idf = np.log1p((self.n_docs - df + 0.5) / (df + 0.5)).astype("float32")
+        # per-row length normalisation is fixed for the index; precompute it
+        self._norm = (self.k1 * (1 - self.b + self.b * self.doc_len / max(self.avgdl, 1e-9))).astype("float32")
+
+    def updated(self, keep: np.ndarray, added: List[Dict[str, int]]) -> "BM25Index":
+        """A copy without the rows where ``keep`` is False and with ``added`` appended as new rows.
+
+        Kept postings are filtered and renumbered with numpy; only the added
+        chunks are walked in Python, so the cost follows the change rather
+        than the corpus. Terms left without postings stay in the vocabulary.
+        """
+        started = time.perf_counter()
+        index = BM25Index.__new__(BM25Index)
+        index.k1 = self.k1
+        index.b = self.b
+        keep = np.asarray(keep, dtype=bool)
+        row_map = np.cumsum(keep) - 1
+        row_map[~keep] = -1
+        mapped = row_map[self.rows]
+        live = mapped >= 0
+        term_of = np.repeat(np.arange(len(self.offsets) - 1), np.diff(self.offsets))
+
+        index.vocab = dict(self.vocab)
+        base = int(keep.sum())
+        add_terms: List[int] = []
+        add_rows: List[int] = []
+        add_tfs: List[int] = []
+        lengths = []
+        for offset, tf in enumerate(added):
+            lengths.append(sum(tf.values()))
+            for term, count in tf.items():
+                add_terms.append(index.vocab.setdefault(term, len(index.vocab)))
+                add_rows.append(base + offset)
+                add_tfs.append(count)
+
+        terms = np.concatenate([term_of[live], np.asarray(add_terms, dtype="int64")])
+        # stable: kept rows stay ahead of (and below) the appended ones
+        order = np.argsort(terms, kind="stable")
+        index.rows = np.concatenate([mapped[live], np.asarray(add_rows, dtype="int64")]).astype("int32")[order]
+        index.tfs = np.concatenate([self.tfs[live], np.asarray(add_tfs, dtype="float32")])[order]
+        counts = np.bincount(terms, minlength=len(index.vocab))
+        index.offsets = np.concatenate([[0], np.cumsum(counts)]).astype("int64")
+        index.doc_len = np.concatenate([self.doc_len[keep], np.asarray(lengths, dtype="float32")])
+        index._finish()
+        logger.info(
+            f"Updated BM25 index: -{len(keep) - base} +{len(added)} chunks, {index.n_docs} chunks, "
+            f"{len(index.rows)} postings in {time.perf_counter() - started:.2f}s"
+        )
+        return index
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """Return (row, bm25 score) pairs, best first."""
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not term_ids or self.n_docs == 0:
+            return []
+        hit_rows = []
+        hit_scores = []
+        for t in term_ids:
+            lo, hi = self.offsets[t], self.offsets[t + 1]
+            if lo == hi:
+                continue
+            rows = self.rows[lo:hi]
+            tf = self.tfs[lo:hi]
+            hit_rows.append(rows)
+            hit_scores.append(self.idf[t] * tf * (self.k1 + 1) / (tf + self._norm[rows]))
+        if not hit_rows:
+            return []
+        rows = np.concatenate(hit_rows)
+        contrib = np.concatenate(hit_scores)
+        # sum contributions per row over only the rows that matched
+        uniq, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=contrib)
+        k = min(top_k, len(uniq))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(uniq[i]), float(scores[i])) for i in best]
+
+
+def fuse(dense: List[Tuple[int, float]], lexical: List[Tuple[int, float]], method: str = "rrf",
+         lexical_weight: float = 0.5, rrf_k: int = 60) -> List[int]:
+    """Merge two ranked (row, score) lists into one ranked list of rows.
+
+    ``rrf`` uses reciprocal-rank fusion; ``weighted`` mixes the dense
+    cosine with the BM25 score scaled to [0, 1] by the best lexical hit.
+    """
+    fused: Dict[int, float] = {}
+    if method == "weighted":
+        top_lex = lexical[0][1] if lexical else 1.0
+        for row, score in dense:
+            fused[row] = fused.get(row, 0.0) + (1 - lexical_weight) * score
+        for row, score in lexical:
+            fused[row] = fused.get(row, 0.0) + lexical_weight * score / max(top_lex, 1e-9)
+    else:
+        for rank, (row, _) in enumerate(dense, 1):
+            fused[row] = fused.get(row, 0.0) + (1 - lexical_weight) / (rrf_k + rank)
+        for rank, (row, _) in enumerate(lexical, 1):
+            fused[row] = fused.get(row, 0.0) + lexical_weight / (rrf_k + rank)
+    return sorted(fused, key=fused.get, reverse=True)
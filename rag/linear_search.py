@@ -0,0 +1,150 @@
+import logging
+from typing import Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MATRIX_DTYPES = ("float32", "float16", "int8")
+
+
+def grow_rows(array: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Return ``array`` with ``rows`` appended along axis 0.
+
+    Appends are written into spare capacity of the array's base buffer when
+    there is some, and otherwise copied into a buffer of double the size, so
+    a run of small appends (streaming ingestion) costs amortised O(rows)
+    instead of re-copying the whole matrix every time. Rows already visible
+    through ``array`` are never written, so generations sharing the buffer
+    keep seeing their own rows.
+    """
+    rows = np.asarray(rows, dtype=array.dtype)
+    n, k = len(array), len(rows)
+    base = array.base
+    if (isinstance(base, np.ndarray) and base.flags.owndata and base.flags.writeable
+            and base.dtype == array.dtype and base.shape[1:] == array.shape[1:]
+            and len(base) >= n + k and array.flags.c_contiguous
+            and array.__array_interface__["data"][0] == base.__array_interface__["data"][0]):
+        base[n:n + k] = rows
+        return base[:n + k]
+    base = np.empty((max(2 * n, n + k, 16),) + array.shape[1:], dtype=array.dtype)
+    base[:n] = array
+    base[n:n + k] = rows
+    return base[:n + k]
+
+
+class QuantizedMatrix:
+    """Compact row-vector storage for the faiss-less linear search path.
+
+    ``float16`` halves the memory of a float32 matrix; ``int8`` stores each
+    row as symmetric scalar-quantized codes plus one float32 scale per row
+    (about a quarter of the memory). ``np.asarray`` on an instance gives the
+    dequantized float32 matrix, so snapshots and index rebuilds keep working.
+    """
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray = None):
+        self.codes = codes
+        self.scales = scales
+
+    @property
+    def dtype(self) -> str:
+        return str(self.codes.dtype)
+
+    @classmethod
+    def from_float(cls, embs: np.ndarray, dtype: str) -> "QuantizedMatrix":
+        embs = np.asarray(embs, dtype="float32")
+        if dtype == "int8":
+            scales = np.abs(embs).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            codes = np.rint(embs / scales[:, None]).astype("int8")
+            return cls(codes, scales.astype("float32"))
+        return cls(embs.astype(dtype))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.codes.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __getitem__(self, rows) -> "QuantizedMatrix":
+        return QuantizedMatrix(self.codes[rows], self.scales[rows] if self.scales is not None else None)
+
+    def append(self, embs: np.ndarray) -> "QuantizedMatrix":
+        other = QuantizedMatrix.from_float(embs, self.dtype)
+        scales = grow_rows(self.scales, other.scales) if self.scales is not None else None
+        return QuantizedMatrix(grow_rows(self.codes, other.codes), scales)
+
+    def block(self, start: int, end: int) -> np.ndarray:
+        """Dequantized float32 rows [start, end)."""
+        rows = self.codes[start:end].astype("float32")
+        if self.scales is not None:
+            rows *= self.scales[start:end, None]
+        return rows
+
+    def __array__(self, dtype=None, copy=None):
+        out = self.block(0, len(self))
+        return out.astype(dtype) if dtype is not None else out
+
+
+Matrix = Union[np.ndarray, QuantizedMatrix]
+
+
+def compress(embs: np.ndarray, dtype: str) -> Matrix:
+    """Return embs in the configured storage dtype (float32 is left as-is)."""
+    if dtype not in MATRIX_DTYPES:
+        logger.warning(f"Unknown matrix dtype {dtype!r}; using float32")
+        dtype = "float32"
+    if dtype == "float32" or isinstance(embs, QuantizedMatrix):
+        return embs
+    return QuantizedMatrix.from_float(embs, dtype)
+
+
+def append_rows(matrix: Matrix, embs: np.ndarray) -> Matrix:
+    if isinstance(matrix, QuantizedMatrix):
+        return matrix.append(embs)
+    return grow_rows(matrix, embs)
+
+
+def topk_inner_product(matrix: Matrix, Q: np.ndarray, k: int,
+                       block_rows: int = 65536) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k rows by inner product for every query row in Q.
+
+    The matrix is scanned in blocks of ``block_rows`` so the score buffer
+    stays bounded, and each block contributes its own top-k via
+    ``argpartition`` (O(N) instead of a full O(N log N) sort). Only the
+    k*blocks surviving candidates are sorted at the end. Returns (scores,
+    rows), each of shape (len(Q), min(k, N)), best first.
+    """
+    n = len(matrix)
+    nq = len(Q)
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros((nq, 0), dtype="float32"), np.zeros((nq, 0), dtype="int64")
+    Q = np.asarray(Q, dtype="float32")
+    best_scores = np.full((nq, 0), -np.inf, dtype="float32")
+    best_rows = np.zeros((nq, 0), dtype="int64")
+    for start in range(0, n, block_rows):
+        end = min(start + block_rows, n)
+        if isinstance(matrix, QuantizedMatrix):
+            rows = matrix.codes[start:end]
+            scores = Q @ rows.astype("float32").T
+            if matrix.scales is not None:
+                scores *= matrix.scales[start:end]
+        else:
+            scores = Q @ np.asarray(matrix[start:end], dtype="float32").T
+        kk = min(k, end - start)
+        part = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+        cand_scores = np.concatenate([best_scores, np.take_along_axis(scores, part, axis=1)], axis=1)
+        cand_rows = np.concatenate([best_rows, part + start], axis=1)
+        if cand_scores.shape[1] > k:
+            keep = np.argpartition(-cand_scores, k - 1, axis=1)[:, :k]
+            cand_scores = np.take_along_axis(cand_scores, keep, axis=1)
+            cand_rows = np.take_along_axis(cand_rows, keep, axis=1)
+        best_scores, best_rows = cand_scores, cand_rows
+    order = np.argsort(-best_scores, axis=1)
+    return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_rows, order, axis=1)
@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LLMClient:
+    """Long-lived OpenAI clients (sync and async) sharing one pool configuration.
+
+    Both clients are created on first use and reused for every question, so
+    the HTTP connection pool, keep-alive connections and TLS sessions survive
+    between requests. Connection reuse is measured with httpx trace hooks:
+    every request counts, and every fresh TCP connect counts as a new
+    connection; the difference is the number of reused connections.
+    """
+
+    def __init__(self):
+        self._sync = None
+        self._async = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.total_latency = 0.0
+
+    def _limits(self):
+        import httpx
+        return httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+        )
+
+    def _timeout(self):
+        import httpx
+        return httpx.Timeout(settings.LLM_TIMEOUT_SECONDS, connect=settings.LLM_CONNECT_TIMEOUT_SECONDS)
+
+    def _on_trace(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            self.new_connections += 1
+
+    async def _on_trace_async(self, event_name: str, info: dict):
+        self._on_trace(event_name, info)
+
+    def _on_request(self, request):
+        self.requests += 1
+        request.extensions["trace"] = self._on_trace
+
+    async def _on_request_async(self, request):
+        self.requests += 1
+        request.extensions["trace"] = self._on_trace_async
+
+    @property
+    def sync(self):
+        if self._sync is None:
+            with self._lock:
+                if self._sync is None:
+                    import httpx
+                    from openai import OpenAI
+                    http_client = httpx.Client(
+                        limits=self._limits(),
+                        timeout=self._timeout(),
+                        event_hooks={"request": [self._on_request]},
+                    )
+                    self._sync = OpenAI(
+                        api_key=settings.OPENAI_API_KEY,
+                        http_client=http_client,
+                        max_retries=settings.LLM_MAX_RETRIES,
+                        timeout=self._timeout(),
+                    )
+        return self._sync
+
+    @property
+    def async_(self):
+        if self._async is None:
+            with self._lock:
+                if self._async is None:
+                    import httpx
+                    from openai import AsyncOpenAI
+                    http_client = httpx.AsyncClient(
+                        limits=self._limits(),
+                        timeout=self._timeout(),
+                        event_hooks={"request": [self._on_request_async]},
+                    )
+                    self._async = AsyncOpenAI(
+                        api_key=settings.OPENAI_API_KEY,
+                        http_client=http_client,
+                        max_retries=settings.LLM_MAX_RETRIES,
+                        timeout=self._timeout(),
+                    )
+        return self._async
+
+    def record_latency(self, started: float):
+        self.total_latency += time.perf_counter() - started
+
+    def stats(self) -> dict:
+        reused = max(0, self.requests - self.new_connections)
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": reused,
+            "reuse_ratio": round(reused / self.requests, 3) if self.requests else 0.0,
+            "avg_latency_ms": round(1000 * self.total_latency / self.requests, 1) if self.requests else 0.0,
+        }
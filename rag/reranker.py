@@ -0,0 +1,90 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderReranker:
+    """Re-scores retrieval candidates with a small cross-encoder.
+
+    All (query, chunk) pairs are scored in one batch on a dedicated worker
+    thread. If scoring does not finish within ``budget_ms``, or the worker
+    is still busy with an earlier request, the dense order is kept, so one
+    slow request never pushes the retrieval latency past the budget.
+    """
+
+    def __init__(self, model_name: str, keep: int = 4, budget_ms: float = 150.0):
+        self.model_name = model_name
+        self.keep = keep
+        self.budget = budget_ms / 1000.0
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reranker")
+        self._busy = threading.Semaphore(1)
+        self.reranked = 0
+        self.fallbacks = 0
+        self.total_ms = 0.0
+
+    def _get_model(self):
+        """Lazy load the cross-encoder to avoid requiring it at import time."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name)
+        return self._model
+
+    def warm_up(self):
+        """Load the model in the background so the first request fits the budget."""
+        self._executor.submit(self._get_model)
+
+    def _score(self, query: str, texts: List[str]):
+        try:
+            return self._get_model().predict([(query, t) for t in texts], show_progress_bar=False)
+        finally:
+            self._busy.release()
+
+    def rerank(self, query: str, texts: List[str], keep: int = None) -> List[int]:
+        """Indices of the best ``keep`` texts by cross-encoder score, best first.
+
+        Falls back to the first ``keep`` indices (the dense order) when the
+        time budget is exceeded or scoring fails.
+        """
+        keep = keep or self.keep
+        dense_order = list(range(min(keep, len(texts))))
+        if len(texts) <= 1:
+            return dense_order
+        if not self._busy.acquire(blocking=False):
+            self.fallbacks += 1
+            logger.info("Reranker busy; keeping dense order")
+            return dense_order
+        started = time.perf_counter()
+        future = self._executor.submit(self._score, query, texts)
+        try:
+            scores = future.result(timeout=self.budget)
+        except FutureTimeout:
+            self.fallbacks += 1
+            logger.info(f"Reranking exceeded {self.budget * 1000:.0f}ms budget; keeping dense order")
+            return dense_order
+        except Exception as e:
+            self.fallbacks += 1
+            logger.warning("reranking failed: %s", e)
+            return dense_order
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.reranked += 1
+        self.total_ms += elapsed_ms
+        order = sorted(range(len(texts)), key=lambda i: float(scores[i]), reverse=True)
+        logger.info(f"Reranked {len(texts)} candidates in {elapsed_ms:.1f}ms; keeping {keep}")
+        return order[:keep]
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model_name,
+            "reranked": self.reranked,
+            "fallbacks": self.fallbacks,
+            "avg_ms": round(self.total_ms / self.reranked, 1) if self.reranked else 0.0,
+            "budget_ms": self.budget * 1000,
+        }
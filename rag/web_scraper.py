@@ -1,40 +1,104 @@
+import gzip
+import hashlib
+import heapq
 import logging
+import threading
 import time
-import warnings
-from typing import Set, List
-from urllib.parse import urljoin, urlparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set, List, Tuple
+from urllib import robotparser
+from urllib.parse import parse_qsl, urlencode, urlparse
+from xml.etree import ElementTree
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 
-# Suppress XML parsing warnings
-try:
-    from bs4 import XMLParsedAsHTMLWarning
-    warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
-except Exception:
-    pass
+from rag.crawl_cache import CrawlCache
+from rag.html_extract import extract_sections, remove_site_chrome, sections_to_text
 
 logger = logging.getLogger(__name__)
 
+# query parameters that only track the visitor and never change the content
+_TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid", "sessionid", "phpsessid", "sid")
+
+
+def _local_name(tag: str) -> str:
+    """XML tag without its namespace, e.g. ``url`` for ``{http://...}url``."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _parse_lastmod(value: Optional[str]) -> Optional[float]:
+    """Unix time of a sitemap ``<lastmod>`` (W3C datetime); None if absent or malformed."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
 
 class UniversityWebScraper:
-    def __init__(self, base_url: str, max_pages: int = 50, delay_seconds: float = 0.5):
+    # sitemap files (including nested sitemap indexes) read per crawl
+    max_sitemaps = 20
+    # more query parameters than this is usually a calendar or faceted-search trap
+    max_query_params = 2
+
+    def __init__(self, base_url: str, max_pages: int = 50, delay_seconds: float = 0.5,
+                 max_concurrency: int = 4, timeout: float = 10.0, cache: Optional[CrawlCache] = None,
+                 use_sitemap: bool = False, html_parser: str = "auto"):
         """
         Initialize web scraper for library or university website.
         
         Args:
             base_url: Starting URL (e.g., https://library.university.edu/ or https://miu.edu.ng/)
             max_pages: Maximum pages to crawl
-            delay_seconds: Delay between requests (be respectful)
+            delay_seconds: Minimum gap between requests to the same host (be respectful)
+            max_concurrency: Maximum number of fetches in flight
+            timeout: Per-request timeout in seconds
+            cache: Crawl cache for conditional re-fetching of known pages
+            use_sitemap: Seed the crawl from robots.txt and sitemap.xml and obey robots.txt
+            html_parser: HTML parser backend, one of rag.html_extract.HTML_PARSERS
         """
         self.base_url = base_url.rstrip('/')
         self.domain = urlparse(base_url).netloc
         self.max_pages = max_pages
         self.delay_seconds = delay_seconds
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
         self.visited: Set[str] = set()
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'LibraryChat-Bot/1.0 (Educational & Research Purpose)'
         })
+        # keep one pooled keep-alive connection per concurrent fetch
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._host_lock = threading.Lock()
+        self._next_slot: Dict[str, float] = {}
+        self.cache = cache
+        self.use_sitemap = use_sitemap
+        self.html_parser = html_parser
+        self._robots: Optional[robotparser.RobotFileParser] = None
+        # URLs whose fetch failed in the last crawl; callers keep their old content
+        self.failed: Set[str] = set()
+        self.stats = {"fetched": 0, "not_modified": 0, "lastmod_skipped": 0, "changed": 0, "failed": 0,
+                      "chrome_blocks": 0}
+        self._seq = 0
+
+    @staticmethod
+    def _normalize_url(url: str) -> str:
+        """URL without fragment and tracking parameters, remaining query sorted."""
+        parsed = urlparse(url)
+        params = sorted(
+            (k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+            if not k.lower().startswith(_TRACKING_PARAMS)
+        )
+        query = f"?{urlencode(params)}" if params else ""
+        return f"{parsed.scheme}://{parsed.netloc}{parsed.path or '/'}{query}"
 
     def _is_valid_url(self, url: str) -> bool:
         """Check if URL belongs to the domain and is not a duplicate."""
@@ -43,8 +107,7 @@ class UniversityWebScraper:
         if parsed.netloc != self.domain:
             return False
         # Avoid duplicates and fragments
-        clean_url = f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
-        if clean_url in self.visited:
+        if self._normalize_url(url) in self.visited:
             return False
         
         # Skip common non-content URLs and malformed patterns
@@ -53,80 +116,226 @@ class UniversityWebScraper:
             'javascript:', '#', 'mailto:', 'tel:',
             'mail.miu.edu.ng', 'mewaruniversitynigeria', 'miunigeria',  # malformed links
             'facebook.com', 'twitter.com', 'instagram.com', 'linkedin.com',  # social media
-            '/search', '/login', '/admin', '?', '&'  # utility pages
+            '/search', '/login', '/admin',  # utility pages
         ]
         url_lower = url.lower()
         if any(pattern in url_lower for pattern in skip_patterns):
             return False
+        if len(parse_qsl(urlparse(self._normalize_url(url)).query)) > self.max_query_params:
+            return False
+        if self._robots is not None and not self._robots.can_fetch(self.session.headers['User-Agent'], url):
+            return False
         
         return True
 
     def _extract_text_from_html(self, html: str) -> str:
         """Extract clean text from HTML."""
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            soup = BeautifulSoup(html, 'html.parser')
-        # Remove script and style
-        for tag in soup(['script', 'style', 'nav', 'footer']):
-            tag.decompose()
-        # Get text
-        text = soup.get_text(separator='\n', strip=True)
-        # Clean up whitespace
-        lines = [line.strip() for line in text.split('\n') if line.strip()]
-        return '\n'.join(lines)
+        return self._parse_page(html, self.base_url)[0]
+
+    def _parse_page(self, html, page_url: str) -> Tuple[str, List[str]]:
+        """Text and absolute link targets of a page, from a single parse.
+
+        The text is the page's content sections as Markdown headings and
+        paragraphs (see rag.html_extract); nav, footer and similar chrome
+        are left out but their links are kept.
+        """
+        sections, links = extract_sections(html, page_url, self.html_parser)
+        return sections_to_text(sections), links
+
+    def _wait_turn(self, host: str):
+        """Block until host may be requested again.
+
+        Each caller reserves the next free slot under the lock, so concurrent
+        workers hitting one host are spaced delay_seconds apart.
+        """
+        with self._host_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.delay_seconds
+        if slot > now:
+            time.sleep(slot - now)
+
+    def _get(self, url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        self._wait_turn(urlparse(url).netloc)
+        logger.info(f"Scraping: {url}")
+        response = self.session.get(url, timeout=self.timeout, headers=headers)
+        response.raise_for_status()
+        return response
+
+    def _crawl_one(self, url: str, lastmod: Optional[float] = None) -> Dict:
+        """Fetch url once and return its page record.
+
+        The record has the normalized "url", "text", "links", the text's
+        "sha256", whether the text "changed" since the cached copy, and a
+        "status" of fetched, not_modified, lastmod_skipped, skipped or
+        failed. A cached page whose sitemap lastmod is no later than its
+        last fetch is returned without a request; any other cached page is
+        revalidated with a conditional GET, and on 304 the cached text and
+        links are returned unparsed.
+        """
+        clean_url = self._normalize_url(url)
+        record = {"url": clean_url, "text": "", "links": [], "sha256": None, "changed": False}
+        entry = self.cache.get(clean_url) if self.cache is not None else None
+        if entry is not None and lastmod is not None and lastmod <= entry["fetched_at"]:
+            return dict(record, text=entry["text"], links=entry["links"], sha256=entry["sha256"],
+                        status="lastmod_skipped")
+        try:
+            response = self._get(url, headers=CrawlCache.conditional_headers(entry))
+        except Exception as e:
+            logger.warning(f"Failed to fetch {url}: {e}")
+            return dict(record, status="failed")
+        if response.status_code == 304 and entry is not None:
+            # the content is current as of now, so a sitemap lastmod up to now skips it next time
+            self.cache.touch(clean_url, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            return dict(record, text=entry["text"], links=entry["links"], sha256=entry["sha256"],
+                        status="not_modified")
+        content_type = response.headers.get('Content-Type', '')
+        if content_type and 'html' not in content_type.lower():
+            logger.debug(f"Skipping non-HTML {url} ({content_type})")
+            return dict(record, status="skipped")
+        text, links = self._parse_page(response.content, response.url)
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if self.cache is not None:
+            self.cache.put(clean_url, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                           digest, text, links)
+        return dict(record, text=text, links=links, sha256=digest,
+                    changed=entry is None or entry["sha256"] != digest, status="fetched")
 
     def fetch_page(self, url: str) -> str:
         """Fetch and extract text from a single page."""
-        if url in self.visited:
+        clean_url = self._normalize_url(url)
+        if clean_url in self.visited:
             return ""
         
-        self.visited.add(url)
+        self.visited.add(clean_url)
+        return self._crawl_one(url)["text"]
+
+    def _enqueue(self, url: str, frontier: list, depth: int, priority: float = 0.0,
+                 lastmod: Optional[float] = None):
+        """Queue url unless seen; higher sitemap priority first, then shallower link depth."""
+        if self._is_valid_url(url):
+            self.visited.add(self._normalize_url(url))
+            self._seq += 1
+            heapq.heappush(frontier, (-priority, depth, self._seq, url, lastmod))
+
+    def _load_robots(self) -> List[str]:
+        """Read robots.txt for the crawl rules; return the sitemap URLs to seed from."""
+        parsed = urlparse(self.base_url)
+        root = f"{parsed.scheme}://{parsed.netloc}"
+        sitemaps = []
         try:
-            logger.info(f"Scraping: {url}")
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            return self._extract_text_from_html(response.content)
+            response = self._get(f"{root}/robots.txt")
+            robots = robotparser.RobotFileParser()
+            robots.parse(response.text.splitlines())
+            self._robots = robots
+            sitemaps = list(robots.site_maps() or [])
         except Exception as e:
-            logger.warning(f"Failed to fetch {url}: {e}")
-            return ""
+            logger.info(f"No usable robots.txt at {root}: {e}")
+        return sitemaps or [f"{root}/sitemap.xml"]
 
-    def crawl(self) -> List[str]:
-        """
-        Crawl the website and return list of text chunks.
+    def _sitemap_entries(self, sitemap_urls: List[str]) -> List[Tuple[str, float, Optional[float]]]:
+        """(url, priority, lastmod) of every page listed in the sitemaps.
+
+        Sitemap indexes are followed, up to max_sitemaps files in total;
+        gzipped sitemaps are decompressed. Priority defaults to 0.5.
         """
-        pages_crawled = 0
-        to_visit = [self.base_url]
-        all_text = []
-
-        while to_visit and pages_crawled < self.max_pages:
-            url = to_visit.pop(0)
-            
-            if not self._is_valid_url(url):
+        entries = []
+        seen: Set[str] = set()
+        todo = list(sitemap_urls)
+        while todo and len(seen) < self.max_sitemaps:
+            sitemap_url = todo.pop(0)
+            if sitemap_url in seen:
                 continue
-
-            text = self.fetch_page(url)
-            if text:
-                all_text.append(text)
-                pages_crawled += 1
-
-            # Extract links from the page
+            seen.add(sitemap_url)
             try:
-                response = self.session.get(url, timeout=10)
-                with warnings.catch_warnings():
-                    warnings.simplefilter("ignore")
-                    soup = BeautifulSoup(response.content, 'html.parser')
-                for link in soup.find_all('a', href=True):
-                    href = link['href'].strip()
-                    if not href or href.startswith('#'):
-                        continue
-                    absolute_url = urljoin(url, href)
-                    if self._is_valid_url(absolute_url):
-                        to_visit.append(absolute_url)
+                content = self._get(sitemap_url).content
+                if content[:2] == b"\x1f\x8b":
+                    content = gzip.decompress(content)
+                root = ElementTree.fromstring(content)
             except Exception as e:
-                logger.debug(f"Error extracting links from {url}: {e}")
+                logger.warning(f"Failed to read sitemap {sitemap_url}: {e}")
+                continue
+            for node in root:
+                fields = {_local_name(child.tag): (child.text or "").strip() for child in node}
+                loc = fields.get("loc")
+                if not loc:
+                    continue
+                if _local_name(node.tag) == "sitemap":
+                    todo.append(loc)
+                    continue
+                try:
+                    priority = float(fields.get("priority") or 0.5)
+                except ValueError:
+                    priority = 0.5
+                entries.append((loc, priority, _parse_lastmod(fields.get("lastmod"))))
+        logger.info(f"Read {len(entries)} URLs from {len(seen)} sitemap(s)")
+        return entries
+
+    def crawl_pages(self) -> List[Dict]:
+        """
+        Crawl the website and return a record (see _crawl_one) per page with text.
+
+        Best-first from base_url: sitemap URLs by their priority (when
+        use_sitemap is set), then pages found through links by link depth.
+        Every URL is fetched once and parsed once for both text and links,
+        with up to max_concurrency fetches in flight.
+        """
+        started = time.perf_counter()
+        frontier: list = []
+        pages = []
+        self.failed = set()
+        if self.use_sitemap:
+            sitemaps = self._load_robots()
+            for loc, priority, lastmod in self._sitemap_entries(sitemaps):
+                self._enqueue(loc, frontier, depth=0, priority=priority, lastmod=lastmod)
+        self._enqueue(self.base_url, frontier, depth=0, priority=1.0)
 
-            # Be respectful: add delay between requests
-            time.sleep(self.delay_seconds)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="crawler") as pool:
+            in_flight = {}
+            while frontier or in_flight:
+                # don't start more fetches than pages we still need
+                while (frontier and len(in_flight) < self.max_concurrency
+                       and len(pages) + len(in_flight) < self.max_pages):
+                    _, depth, _, url, lastmod = heapq.heappop(frontier)
+                    in_flight[pool.submit(self._crawl_one, url, lastmod)] = depth
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    depth = in_flight.pop(future)
+                    record = future.result()
+                    if record["status"] == "failed":
+                        self.failed.add(record["url"])
+                        self.stats["failed"] += 1
+                    elif record["status"] in self.stats:
+                        self.stats[record["status"]] += 1
+                    self.stats["changed"] += record["changed"]
+                    if record["text"] and len(pages) < self.max_pages:
+                        pages.append(record)
+                    for link in record["links"]:
+                        self._enqueue(link, frontier, depth=depth + 1)
 
-        logger.info(f"Crawled {pages_crawled} pages from {self.base_url}")
-        return all_text
+        # a stable order, so repeated site chrome stays on the same page every run;
+        # the cache keeps the full text
+        pages.sort(key=lambda page: page["url"])
+        texts, self.stats["chrome_blocks"] = remove_site_chrome([page["text"] for page in pages])
+        for page, text in zip(pages, texts):
+            if text != page["text"]:
+                page["text"] = text
+                page["sha256"] = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        pages = [page for page in pages if page["text"]]
+
+        logger.info(
+            f"Crawled {len(pages)} pages from {self.base_url} in {time.perf_counter() - started:.1f}s "
+            f"({self.stats['fetched']} fetched, {self.stats['not_modified']} not modified, "
+            f"{self.stats['lastmod_skipped']} unchanged per sitemap, "
+            f"{self.stats['changed']} changed, {self.stats['failed']} failed; "
+            f"{self.stats['chrome_blocks']} repeated blocks removed)"
+        )
+        return pages
+
+    def crawl(self) -> List[str]:
+        """
+        Crawl the website and return list of page texts.
+        """
+        return [page["text"] for page in self.crawl_pages()]
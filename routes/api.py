@@ -1,10 +1,23 @@
+import json
+from typing import List, Optional
+
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 from models.schemas import ChatRequest, MenuRequest
 from services.qa_service import QAService
 
 router = APIRouter()
 service = QAService()
 
+MAX_BATCH_QUERIES = 256
+MAX_BATCH_TOP_K = 100
+
+
+class RetrieveBatchRequest(BaseModel):
+    queries: List[str]
+    top_k: Optional[int] = None
+
 
 @router.post("/chat")
 def chat_endpoint(req: ChatRequest):
@@ -19,16 +32,86 @@ def chat_endpoint(req: ChatRequest):
     raise HTTPException(status_code=400, detail="Invalid mode")
 
 
+@router.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest):
+    """Stream an answer as server-sent events.
+
+    Emits ``token`` events with answer text as it is generated, then one
+    ``done`` event with the final answer, confidence and sources.
+    """
+    if req.mode != "ask":
+        raise HTTPException(status_code=400, detail="Streaming is only available in ask mode")
+
+    async def events():
+        async for event in service.stream_question(req.question):
+            name = event.pop("event")
+            yield f"event: {name}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/retrieve/batch")
+def retrieve_batch(req: RetrieveBatchRequest):
+    """Retrieve chunks for many queries at once (internal tools, cache warm-up).
+
+    Hits are the raw top-k chunks of one batched index search: unlike the
+    chat path they are not re-ranked and adjacent chunks are not merged.
+    """
+    if len(req.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    if req.top_k is not None and not 1 <= req.top_k <= MAX_BATCH_TOP_K:
+        raise HTTPException(status_code=400, detail=f"top_k must be between 1 and {MAX_BATCH_TOP_K}")
+    results = service.pipeline.retrieve_many(req.queries, top_k=req.top_k)
+    return {
+        "results": [
+            {"query": q, "hits": [{"text": doc, "score": score} for doc, score in hits]}
+            for q, hits in zip(req.queries, results)
+        ]
+    }
+
+
 @router.get("/menu")
 def menu():
     return {"menu": service.get_menu()}
 
 
+@router.get("/metrics")
+def metrics():
+    return {
+        "llm": service.pipeline.llm.stats(),
+        "query_embedding_cache": service.pipeline.query_cache.stats() if service.pipeline.query_cache else None,
+        "query_batcher": service.pipeline.query_batcher.stats() if service.pipeline.query_batcher else None,
+        "reranker": service.pipeline.reranker.stats() if service.pipeline.reranker else None,
+        "answer_cache": service.answer_cache.stats() if service.answer_cache else None,
+        "answers": {
+            "total_queries": service.total_queries,
+            "unanswered": service.unanswered,
+            "incomplete": service.incomplete_answers,
+        },
+    }
+
+
 @router.post("/reload")
 def reload_knowledge_base():
-    """Reload the knowledge base from local documents."""
+    """Start a background reload of the knowledge base from local documents.
+
+    Only changed files are re-embedded; queries keep using the current index
+    until the new generation is published. Poll /reload/{job_id} for progress.
+    """
     try:
-        service.pipeline.ingest_documents_from_folder("data")
-        return {"status": "success", "message": "Knowledge base reloaded from local documents"}
+        job = service.reloads.submit("data")
+        return {"status": "accepted", "job_id": job.id, "job": job.to_dict()}
     except Exception as e:
         return {"status": "error", "message": str(e)}
+
+
+@router.get("/reload/{job_id}")
+def reload_status(job_id: str):
+    job = service.reloads.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown reload job")
+    return {**job.to_dict(), "generation": service.pipeline.generation.number}
@@ -1,8 +1,12 @@
+import asyncio
 import logging
 import os
-from typing import Optional
+import time
+from typing import AsyncIterator, Optional
 
+from rag.answer_cache import SemanticAnswerCache
 from rag.pipeline import RAGPipeline
+from services.reload_service import ReloadManager
 from config.settings import settings
 from models.schemas import ChatResponse
 from utils.sanitizer import sanitize_input, detect_prompt_injection
@@ -13,6 +17,7 @@ logger = logging.getLogger(__name__)
 class QAService:
     def __init__(self):
         self.pipeline = RAGPipeline()
+        self.reloads = ReloadManager(self.pipeline)
         
         # Try to ingest from web if URL is configured
         web_url = os.environ.get("UNIVERSITY_WEB_URL", "")
@@ -37,6 +42,15 @@ class QAService:
         # analytics
         self.total_queries = 0
         self.unanswered = 0
+        self.incomplete_answers = 0
+
+        self.answer_cache = None
+        if settings.ANSWER_CACHE_ENABLED:
+            self.answer_cache = SemanticAnswerCache(
+                capacity=settings.ANSWER_CACHE_SIZE,
+                ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+                threshold=settings.ANSWER_CACHE_THRESHOLD,
+            )
 
         self.guided = {
             "Browse Catalog": "You can search our online library catalog at the library portal. Search by title, author, ISBN, or subject. Use call numbers to locate items on the shelf.",
@@ -79,7 +93,14 @@ class QAService:
             self.unanswered += 1
             return ChatResponse(answer="I do not have that information. Please contact the relevant university office.", confidence=0.0)
 
-        retrieved = self.pipeline.retrieve(q)
+        started = time.perf_counter()
+        q_vec = self.pipeline.embed_query(q)
+        generation = self.pipeline.generation.number
+        cached = self.answer_cache.lookup(q_vec, generation) if self.answer_cache else None
+        if cached is not None:
+            return ChatResponse(**cached)
+
+        retrieved = self.pipeline.retrieve(q, query_vector=q_vec)
         logger.info(f"Retrieved {len(retrieved)} chunks. Best score: {max((s for _, s in retrieved), default=0):.3f}")
         
         if not retrieved:
@@ -87,7 +108,8 @@ class QAService:
             self.unanswered += 1
             return ChatResponse(answer="I do not have that information. Please contact the relevant university office.", confidence=0.0)
         
-        answer, score = self.pipeline.generate_answer(q, retrieved, self.system_prompt)
+        usage = {}
+        answer, score = self.pipeline.generate_answer(q, retrieved, self.system_prompt, usage=usage)
 
         # Only reject if answer is explicitly None (threshold not met in generate_answer)
         if answer is None:
@@ -98,4 +120,75 @@ class QAService:
         # log successful
         logger.info("answered query (score=%s): %s", score, q)
         sources = [d for d, _ in retrieved[: settings.TOP_K]]
-        return ChatResponse(answer=answer, confidence=float(score), source_documents=sources)
+        payload = {"answer": answer, "confidence": float(score), "source_documents": sources}
+        if self.answer_cache:
+            self.answer_cache.store(q_vec, generation, payload,
+                                    latency=time.perf_counter() - started,
+                                    tokens=usage.get("total_tokens", 0))
+        return ChatResponse(**payload)
+
+    async def stream_question(self, question: str) -> AsyncIterator[dict]:
+        """Answer a question as a stream of events.
+
+        Yields {"event": "token", "text": ...} while the model is generating
+        and finishes with a single {"event": "done", ...} carrying the full
+        answer, confidence and source documents. If generation fails after
+        some tokens were sent, "done" carries the partial answer with
+        "incomplete": True.
+        """
+        fallback = "I do not have that information. Please contact the relevant university office."
+        self.total_queries += 1
+        q = sanitize_input(question)
+        if detect_prompt_injection(q):
+            logger.warning("prompt injection detected for query")
+            self.unanswered += 1
+            yield {"event": "done", "answer": fallback, "confidence": 0.0, "source_documents": []}
+            return
+
+        started = time.perf_counter()
+        # embedding and retrieval are CPU-bound; keep them off the event loop
+        q_vec = await asyncio.to_thread(self.pipeline.embed_query, q)
+        generation = self.pipeline.generation.number
+        cached = self.answer_cache.lookup(q_vec, generation) if self.answer_cache else None
+        if cached is not None:
+            yield {"event": "token", "text": cached["answer"]}
+            yield {"event": "done", **cached}
+            return
+
+        retrieved = await asyncio.to_thread(self.pipeline.retrieve, q, None, q_vec)
+        messages, score = self.pipeline.build_messages(q, retrieved, self.system_prompt)
+        if messages is None:
+            logger.info("no usable documents for streamed question (score=%s): %s", score, q)
+            self.unanswered += 1
+            answer = fallback if not retrieved else "I do not have that information. Please contact miulibrary2025@gmail.com for assistance."
+            yield {"event": "done", "answer": answer, "confidence": float(score), "source_documents": []}
+            return
+
+        parts = []
+        completed = False
+        try:
+            async for delta in self.pipeline.stream_answer(messages):
+                parts.append(delta)
+                yield {"event": "token", "text": delta}
+            completed = True
+        except Exception as e:
+            logger.exception("LLM stream failed: %s", e)
+            if not parts:
+                self.unanswered += 1
+                yield {"event": "done", "answer": "I do not have that information. Please contact miulibrary2025@gmail.com for assistance.",
+                       "confidence": float(score), "source_documents": []}
+                return
+
+        sources = [d for d, _ in retrieved[: settings.TOP_K]]
+        payload = {"answer": "".join(parts).strip(), "confidence": float(score), "source_documents": sources}
+        if not completed:
+            # flagged so clients do not show it as final; never cached
+            logger.warning("streamed answer cut off after %d tokens: %s", len(parts), q)
+            self.incomplete_answers += 1
+            yield {"event": "done", **payload, "incomplete": True}
+            return
+        logger.info("answered streamed query (score=%s): %s", score, q)
+        if self.answer_cache:
+            # streamed responses carry no usage block, so only latency is credited
+            self.answer_cache.store(q_vec, generation, payload, latency=time.perf_counter() - started)
+        yield {"event": "done", **payload}
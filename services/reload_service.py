@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from rag.pipeline import RAGPipeline
+
+logger = logging.getLogger(__name__)
+
+
+class ReloadJob:
+    """Progress record for one background knowledge-base reload."""
+
+    def __init__(self, folder: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.folder = folder
+        self.status = "queued"
+        self.files_total = 0
+        self.files_processed = 0
+        self.chunks_total = 0
+        self.chunks_embedded = 0
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.stats: Optional[dict] = None
+        self.error: Optional[str] = None
+
+    def update(self, **progress):
+        for key, value in progress.items():
+            setattr(self, key, value)
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def eta_seconds(self) -> Optional[float]:
+        """Linear extrapolation from the file phase, then the embedding phase.
+
+        Files are parsed while earlier chunks are embedded, so chunks_total
+        is only final once every file has been processed.
+        """
+        if self.status != "running" or self.started is None:
+            return None
+        elapsed = time.time() - self.started
+        if self.files_total and self.files_processed < self.files_total:
+            done, total = self.files_processed, self.files_total
+        elif self.chunks_total:
+            done, total = self.chunks_embedded, self.chunks_total
+        else:
+            return None
+        if done <= 0:
+            return None
+        return round(elapsed * (total - done) / done, 1)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "files_total": self.files_total,
+            "files_processed": self.files_processed,
+            "chunks_total": self.chunks_total,
+            "chunks_embedded": self.chunks_embedded,
+            "eta_seconds": self.eta_seconds(),
+            "elapsed_seconds": round(((self.finished or time.time()) - self.started), 1) if self.started else 0.0,
+            "stats": self.stats,
+            "error": self.error,
+        }
+
+
+class ReloadManager:
+    """Runs reloads one at a time on a background thread.
+
+    A reload requested while another is queued or running for the same
+    folder returns the existing job instead of stacking a second one.
+    """
+
+    MAX_JOBS = 20
+
+    def __init__(self, pipeline: RAGPipeline):
+        self.pipeline = pipeline
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kb-reload")
+        self._jobs: "OrderedDict[str, ReloadJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, folder: str = "data") -> ReloadJob:
+        with self._lock:
+            for job in self._jobs.values():
+                if job.active and job.folder == folder:
+                    return job
+            job = ReloadJob(folder)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.MAX_JOBS:
+                self._jobs.popitem(last=False)
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ReloadJob]:
+        return self._jobs.get(job_id)
+
+    def _run(self, job: ReloadJob):
+        job.update(status="running", started=time.time())
+        try:
+            job.stats = self.pipeline.ingest_documents_from_folder(job.folder, progress=job.update)
+            job.update(status="completed")
+        except Exception as e:
+            logger.exception("background reload failed: %s", e)
+            job.update(status="failed", error=str(e))
+        finally:
+            job.finished = time.time()
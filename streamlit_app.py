@@ -1,4 +1,5 @@
 import os
+import json
 import streamlit as st
 import requests
 import time
@@ -867,13 +868,44 @@ def call_guided(option: str) -> dict:
         return {"answer": f"Service unavailable — {e}", "confidence": 0.0}
 
 
-def call_ask(question: str) -> dict:
+def _call_ask_blocking(question: str) -> dict:
+    r = requests.post(f"{st.session_state['api_base']}/chat", json={"mode": "ask", "question": question}, timeout=30)
+    r.raise_for_status()
+    return r.json()
+
+
+def call_ask(question: str, on_token=None) -> dict:
+    """Ask via the SSE endpoint, calling on_token(text_so_far) as tokens arrive."""
     try:
-        r = requests.post(f"{st.session_state['api_base']}/chat", json={"mode": "ask", "question": question}, timeout=30)
-        r.raise_for_status()
-        return r.json()
+        with requests.post(
+            f"{st.session_state['api_base']}/chat/stream",
+            json={"mode": "ask", "question": question},
+            stream=True,
+            timeout=(6, 60),
+        ) as r:
+            if r.status_code == 404:
+                return _call_ask_blocking(question)
+            r.raise_for_status()
+            event, text, result = "message", "", None
+            for line in r.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    payload = json.loads(line[5:].strip())
+                    if event == "token":
+                        text += payload.get("text", "")
+                        if on_token:
+                            on_token(text)
+                    elif event == "done":
+                        result = payload
+                elif not line:
+                    event = "message"
+            return result or {"answer": text or "No response", "confidence": 0.0}
     except Exception as e:
-        return {"answer": f"Service unavailable — {e}", "confidence": 0.0}
+        try:
+            return _call_ask_blocking(question)
+        except Exception:
+            return {"answer": f"Service unavailable — {e}", "confidence": 0.0}
 
 
 CARD_META = {
@@ -958,10 +990,28 @@ def _sidebar_login():
             st.error("Invalid credentials")
 
 
+def _wait_for_reload(job_id: str, bar, timeout: float = 120.0) -> dict:
+    """Poll a background reload job, mirroring its progress on bar."""
+    deadline = time.time() + timeout
+    job = {}
+    while time.time() < deadline:
+        r = requests.get(f"{st.session_state['api_base']}/reload/{job_id}", timeout=6)
+        r.raise_for_status()
+        job = r.json()
+        if job.get("chunks_total"):
+            bar.progress(min(1.0, job["chunks_embedded"] / job["chunks_total"]))
+        elif job.get("files_total"):
+            bar.progress(min(1.0, job["files_processed"] / job["files_total"]))
+        if job.get("status") in ("completed", "failed"):
+            break
+        time.sleep(0.5)
+    return job
+
+
 def _sidebar_kb():
     with st.expander("📤 Knowledge Base", expanded=False):
         st.markdown("Upload documents to update AI knowledge.")
-        files = st.file_uploader("Files", type=["txt", "pdf", "md"], accept_multiple_files=True)
+        files = st.file_uploader("Files", type=["txt", "pdf", "md", "docx"], accept_multiple_files=True)
         if files and st.button("Process & Index", use_container_width=True):
             os.makedirs("data", exist_ok=True)
             bar = st.progress(0)
@@ -972,11 +1022,17 @@ def _sidebar_kb():
             st.success(f"✅ {len(files)} file(s) saved")
             with st.spinner("Reindexing…"):
                 try:
-                    r = requests.post(f"{st.session_state['api_base']}/reload", timeout=60)
-                    if r.status_code == 200:
-                        st.success("✅ Index updated")
-                    else:
+                    r = requests.post(f"{st.session_state['api_base']}/reload", timeout=15)
+                    if r.status_code != 200 or "job_id" not in r.json():
                         st.error(f"Reload failed with status {r.status_code}")
+                    else:
+                        job = _wait_for_reload(r.json()["job_id"], bar)
+                        if job.get("status") == "completed":
+                            st.success("✅ Index updated")
+                        elif job.get("status") == "failed":
+                            st.error(f"Reload failed: {job.get('error')}")
+                        else:
+                            st.info("📚 Reindexing continues in the background.")
                 except requests.exceptions.RequestException as e:
                     st.info("📚 Knowledge base files saved. Auto-reload skipped (backend may be restarting).")
                 except Exception:
@@ -1139,11 +1195,18 @@ def view_chat():
 
     if send and user_input:
         add_message("user", user_input)
+        live = st.empty()
         with st.spinner(""):
-            res = call_ask(user_input)
+            res = call_ask(user_input, on_token=lambda t: live.markdown(
+                f'<div class="chat-container"><div class="msg-row bot"><div class="avatar bot">📚</div>'
+                f'<div><div class="bubble bot">{_esc(t)}</div></div></div></div>',
+                unsafe_allow_html=True,
+            ))
         answer = res.get("answer", "No response")
         conf = res.get("confidence")
-        if conf is not None and conf >= 0:
+        if res.get("incomplete"):
+            answer += "\n\n_The answer was cut off; please try again._"
+        elif conf is not None and conf >= 0:
             answer += f"\n\nConfidence: {int(conf * 100)}%"
         add_message("bot", answer)
         st.rerun()
@@ -1,6 +1,5 @@
 import time
 import mammoth
-from bs4 import BeautifulSoup
 from docx.api import Document
 import re
 
@@ -9,7 +8,7 @@ def extract_and_replace_docx_tables(docx_file, chunk_marker):
 
     document = Document(docx_file)
     docx_tables = document.tables
-    total_tables = len(document.tables)
+    total_tables = len(docx_tables)
 
     with open(docx_file, "rb") as docx_file:
         result = mammoth.convert_to_html(docx_file)
@@ -20,118 +19,113 @@ def extract_and_replace_docx_tables(docx_file, chunk_marker):
     html_chunked_tables = get_html_table_chunks(tables, chunk_marker=chunk_marker)
     
     
+    # one scratch document for all replacement paragraphs; opening the
+    # default template per table used to dominate the run time
+    temp_document = Document()
     html_tables = []
     for table in html_chunked_tables:
-        temp_document = Document()
         html_table = temp_document.add_paragraph(table)._element
         html_table.alignment = 0
         html_tables.append(html_table)
 
-
-    track = 0    
-    while len(document.tables) > 0:
-        track += 1
+    # document.tables re-scans the whole body on every access, so replace
+    # against the list taken once above, in document order
+    body = document.element.body
+    for track, (docx_table, html_table) in enumerate(zip(docx_tables, html_tables), 1):
         try:
-            html_table = html_tables[0]
-            document.element.body.replace(document.tables[0]._element, html_table)
-            html_tables.remove(html_table)
-            end_time = time.time()  # Record end time
-            # print(f'{track} of {total_tables} | Success | Time: {end_time - start_time:.2f} seconds')
-
+            body.replace(docx_table._element, html_table)
         except Exception as e:
             print(f'{track} of {total_tables} | Fail: {e}')
-            if track >= 200:
-                break
+    end_time = time.time()  # Record end time
+    # print(f'{total_tables} tables | Time: {end_time - start_time:.2f} seconds')
             
     return document, html_chunked_tables
 
+_TABLE_TAG_RE = re.compile(r'<(/?)table\b[^>]*>')
+
 def extract_html_tables(html):
-    soup = BeautifulSoup(html, 'html.parser')
-    tables = soup.find_all('table')
+    """HTML of each top-level table, in document order.
+
+    mammoth escapes '<' in text, so the table tags can be matched directly
+    instead of parsing the whole document. Nested tables stay part of their
+    parent's HTML, matching document.tables.
+    """
+    tables = []
+    depth = 0
+    start = 0
+    for m in _TABLE_TAG_RE.finditer(html):
+        if m.group(1):
+            depth -= 1
+            if depth == 0:
+                tables.append(html[start:m.end()])
+        else:
+            if depth == 0:
+                start = m.start()
+            depth += 1
     return tables
 
-def get_html_table_chunks(tables, chunk_marker):
-    
+def _clean_marker_row(row_html, chunk_marker):
     html_chunk_marker = '<strong>' + chunk_marker + '</strong>'
+    for token in ('<p>' + html_chunk_marker + '</p>', html_chunk_marker, chunk_marker):
+        row_html = row_html.replace(token, '')
+    return row_html.replace(' </td>', '</td>')
+
+def split_html_table(html_table_string, chunk_marker):
+    """Split one table after every row holding chunk_marker.
+
+    Every piece is a complete table that repeats the header row (the
+    thead, or else the first row). One left-to-right scan of the string.
+    """
+    bodies = []
+    parts = []
+    pos = 0
+    marker_at = html_table_string.find(chunk_marker)
+    while marker_at >= 0:
+        row_start = html_table_string.rfind('<tr', 0, marker_at)
+        row_end = html_table_string.find('</tr>', marker_at)
+        if row_start < pos or row_end < 0:
+            break
+        row_end += len('</tr>')
+        parts.append(html_table_string[pos:row_start])
+        parts.append(_clean_marker_row(html_table_string[row_start:row_end], chunk_marker))
+        bodies.append(''.join(parts))
+        parts = []
+        pos = row_end
+        marker_at = html_table_string.find(chunk_marker, pos)
+    tail = html_table_string[pos:]
+    if bodies and '<tr' not in tail:
+        # marker on the last row: only the closing tags are left
+        bodies[-1] += tail
+    else:
+        bodies.append(tail)
+    if len(bodies) == 1:
+        return bodies
+
+    start_table = html_table_string[:html_table_string.find('>') + 1]
+    start_tbody = '<tbody>' if '<tbody>' in html_table_string else ''
+    end_tbody = '</tbody>' if '</tbody>' in html_table_string else ''
+    end_table = '</table>'
+    first = bodies[0]
+    if '<thead>' in first:
+        headers = first[first.find('<thead>'):first.find('</thead>') + len('</thead>')]
+    else:
+        headers = first[first.find('<tr'):first.find('</tr>') + len('</tr>')]
+
+    chunks = [first + end_tbody + end_table]
+    for body in bodies[1:-1]:
+        chunks.append(start_table + headers + start_tbody + body + end_tbody + end_table)
+    chunks.append(start_table + headers + start_tbody + bodies[-1])
+    return chunks
+
+def get_html_table_chunks(tables, chunk_marker):
 
     html_table_chunks = []
     
     for table_soup in tables:
-
-        html_table_string = str(table_soup)
-        html_table_string = html_table_string.replace('<table>', '<table>\n')
-        html_table_string = html_table_string.replace('<tr>', '\n<tr>\n')
-        html_table_string = html_table_string.replace('</tr>', '\n</tr>')
-        html_table_string = html_table_string.replace('<thead>', '<thead>')
-        html_table_string = html_table_string.replace('</thead>', '\n</thead>\n')
-        html_table_string = html_table_string.replace('<tbody>', '<tbody>')
-        html_table_string = html_table_string.replace('</tbody>', '\n</tbody>\n')
-
-        with open('table_html.txt', mode='w', encoding='utf8') as f:
-            f.write(html_table_string)
-
-        with open('table_html.txt', mode='r', encoding='utf8') as f:
-            lines = f.readlines()
-
-        start_table = lines[0].strip()
-        end_table = lines[-1].strip()
-        
-        # Get start and end tags for tbody
-        start_tbody = '<tbody>' if '<tbody>' in html_table_string else ''
-        end_tbody = '</tbody>' if '</tbody>' in html_table_string else ''
-
-        # Extract and clean headers if present
-        headers = str(table_soup.find('thead')) if 'thead' in html_table_string else ''
-        headers = re.sub(r'>\n\s*<', '><', headers)
-
-        processed_lines = []
-        for line in lines:
-            if chunk_marker in line:
-                start_index = line.find(html_chunk_marker)
-                chunk_start = start_index - len('<p>')
-                chunk_end = start_index + len(html_chunk_marker) + len('</p>')
-
-                chunk_html = line[chunk_start:chunk_end]
-                if chunk_html.startswith('<p>') & chunk_html.endswith('</p>'):
-                    line = line.replace('<p>', '')
-                    line = line.replace('</p>', '')
-                else:
-                    pass
-
-                line = line.replace(html_chunk_marker, '')
-                line = line.replace(' </td>', '</td>').strip()
-                line += chunk_marker
-
-            processed_lines.append(line)
-
-        processed_lines = [line.strip() for line in processed_lines]
-        html_table = ''.join(processed_lines)
-        html_chunks = html_table.split(chunk_marker)
-
-        proccessed_html_chunks = []
-        for index, chunk in enumerate(html_chunks):
-            if index == 0:
-                chunk += (end_tbody + end_table)
-                first_chunk = chunk.replace(end_table, '')
-                start = first_chunk.find('<tr>')
-                end = first_chunk.find('</tr>') + len('</tr>')
-                headers = first_chunk[start:end]
-
-                    
-            elif chunk == html_chunks[-1]:
-                chunk = start_table + headers + start_tbody + chunk 
-
-            else:
-                chunk = start_table + headers + start_tbody + chunk + end_tbody + end_table
-
-            proccessed_html_chunks.append(chunk)
-
-        chunks_to_html = ''
-        for html_chunk in proccessed_html_chunks:
-                chunks_to_html += wrap_signal(html_chunk, signal_type='html')
-                if html_chunk != proccessed_html_chunks[-1]:
-                    chunks_to_html += f'\n\n{chunk_marker}\n\n'
-        
+        html_chunks = split_html_table(str(table_soup), chunk_marker)
+        chunks_to_html = f'\n\n{chunk_marker}\n\n'.join(
+            wrap_signal(html_chunk, signal_type='html') for html_chunk in html_chunks
+        )
         html_table_chunks.append(chunks_to_html)
         
     return html_table_chunks